@@ -5,9 +5,12 @@ import json
 import io
 import zipfile
 from src.main_pipeline import run_pipeline
-from src.render_story_page import render_story_page
+from src.render_story_page import render_story_page, setup_logging
+from src.panel_assets import get_thumbnail
+from src import tracing
 
 st.set_page_config(page_title="The Great Learning (大学 / Đại Học)", layout="wide")
+setup_logging()
 
 # HEADER
 st.title("The Great Learning (大学 / Đại Học)")
@@ -29,6 +32,11 @@ with st.sidebar:
     st.subheader("🎨 Generation Mode")
     fast_mode = st.toggle("⚡ Fast Mode (Mock Panels)",
                           help="Preview quickly without heavy diffusion rendering")
+    stream_mode = st.toggle("📡 Stream Storyboard → Panels",
+                            help="Start rendering each panel as soon as its prompt is generated")
+    trace_mode = st.toggle("⏱️ Trace Pipeline Stages", value=tracing.is_enabled(),
+                           help="Record wall/CPU time and peak memory per stage (outputs/logs/traces.jsonl)")
+    tracing.set_enabled(trace_mode)
 
     st.divider()
 
@@ -76,7 +84,7 @@ with col2:
                 output_pdf=export_pdf
             )
             if result:
-                st.success(f"Re-rendered {result.get('total_pages', 0)} pages!")
+                st.success(f"Re-rendered {result.get('pages_rendered', 0)} of {result.get('total_pages', 0)} pages!")
             else:
                 st.info("Re-render finished (no summary returned).")
             st.rerun()
@@ -93,6 +101,9 @@ with col3:
                 os.remove(f)
             except:
                 pass
+        import shutil
+        shutil.rmtree(os.path.join(output_dir, ".page_cache"), ignore_errors=True)
+        shutil.rmtree(os.path.join(output_dir, ".derived"), ignore_errors=True)
         st.success("Outputs cleared!")
         st.rerun()
 
@@ -108,6 +119,7 @@ if generate:
         progress_bar.progress(10)
 
         os.environ["FAST_MODE"] = "true" if fast_mode else "false"
+        os.environ["STREAM_STORYBOARD"] = "true" if stream_mode else "false"
 
         try:
             status_text.text("🎨 Generating image panels... This may take several minutes.")
@@ -137,6 +149,27 @@ if generate:
             st.error(f"❌ Error: {str(e)}")
             st.exception(e)
 
+# SIDEBAR: stage timings of the last traced run
+if trace_mode:
+    trace_rows = tracing.last_trace_summary()
+    with st.sidebar:
+        st.subheader("⏱️ Last Run Timings")
+        if trace_rows:
+            st.dataframe(
+                [{
+                    "Stage": r["stage"],
+                    "Wall (s)": round(r["wall_s"], 3),
+                    "CPU (s)": round(r["cpu_s"], 3),
+                    "Max RSS growth (MB)": round(r["max_rss_growth_mb"]),
+                    "Process max RSS (MB)": round(r["max_rss_mb"]),
+                    "Step (ms)": round(r["step_s"] * 1000, 1) if "step_s" in r else None,
+                } for r in trace_rows],
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.caption("No traced run yet.")
+
 # DISPLAY OUTPUTS
 output_dir = "outputs"
 has_outputs = False
@@ -208,18 +241,20 @@ if has_outputs:
             for idx, img_file in enumerate(panel_images):
                 img_path = os.path.join(output_dir, img_file)
                 with cols[idx % 3]:
-                    st.image(img_path, caption=f"Panel {idx + 1}", use_container_width=True)
-
-                    # 💾 Nút tải riêng từng ảnh
-                    with open(img_path, "rb") as f:
-                        st.download_button(
-                            label="💾 Save PNG",
-                            data=f.read(),
-                            file_name=img_file,
-                            mime="image/png",
-                            use_container_width=True,
-                            key=f"download_panel_{idx}"
-                        )
+                    # Serve the cached web thumbnail, not the full-resolution PNG
+                    st.image(get_thumbnail(img_path), caption=f"Panel {idx + 1}", use_container_width=True)
+
+                    # 💾 Nút tải riêng từng ảnh – the full PNG is only read once asked for
+                    if st.button("💾 Save PNG", use_container_width=True, key=f"prepare_panel_{idx}"):
+                        with open(img_path, "rb") as f:
+                            st.download_button(
+                                label=f"⬇️ Download {img_file}",
+                                data=f.read(),
+                                file_name=img_file,
+                                mime="image/png",
+                                use_container_width=True,
+                                key=f"download_panel_{idx}"
+                            )
 
             st.markdown("---")
             st.markdown("### 📦 Download All Panels (ZIP)")
@@ -0,0 +1,57 @@
+# Offline fixtures for the benchmarks: canned storyboards, stub panels, stub LLM and diffusion.
+import os
+import json
+from PIL import Image, ImageDraw
+
+MORAL_LINKS = [
+    "Làm sáng tỏ đức sáng của mình là gốc của việc trị nước. 明明德者，治國之本也。",
+    "Biết dừng ở chỗ chí thiện thì lòng mới định. 知止而後有定。",
+    "Sửa mình trước, rồi mới tề gia, trị quốc, bình thiên hạ. 修身齊家治國平天下。",
+    "Người quân tử cẩn thận khi ở một mình. 君子必慎其獨也。",
+]
+
+
+def make_story(n_panels, title="Đức Sáng – 明德"):
+    """Canned storyboard in the shape call_gemini returns."""
+    return {
+        "story_title": title,
+        "summary": "Benchmark storyboard.",
+        "panels": [
+            {"panel": f"{i:02d}", "moral_link": MORAL_LINKS[(i - 1) % len(MORAL_LINKS)]}
+            for i in range(1, n_panels + 1)
+        ],
+        "image_prompts": [
+            {"panel": f"{i:02d}", "prompt": f"ink wash painting, scholar at a desk, scene {i}", "seed": i}
+            for i in range(1, n_panels + 1)
+        ],
+    }
+
+
+def make_panels(output_dir, n_panels, size=(1024, 768)):
+    """Write n_panels PNG panels (flat colour + label, like render_mock_panel)."""
+    os.makedirs(output_dir, exist_ok=True)
+    for i in range(1, n_panels + 1):
+        img = Image.new("RGB", size, (200 + (i * 7) % 55, 190, 170))
+        d = ImageDraw.Draw(img)
+        d.rectangle([40, 40, size[0] - 40, size[1] - 40], outline="black", width=4)
+        d.text((60, 60), f"Panel {i:02d}", fill="black")
+        img.save(os.path.join(output_dir, f"panel_{i:02d}.png"))
+
+
+def make_story_dir(output_dir, n_pages, panels_per_page=2):
+    """storyboard.json + panels for an n_pages story. Returns the JSON path."""
+    n_panels = n_pages * panels_per_page
+    make_panels(output_dir, n_panels)
+    json_path = os.path.join(output_dir, "storyboard.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(make_story(n_panels), f, ensure_ascii=False, indent=2)
+    return json_path
+
+
+def install_stubs(story):
+    """Route Gemini to FakeGenerativeModel and diffusion to DummyDiffusionPipeline."""
+    from src.gemini_client import set_model_factory, FakeGenerativeModel
+    from src.model_registry import set_pipeline_loader, DummyDiffusionPipeline
+
+    set_model_factory(FakeGenerativeModel.factory(story))
+    set_pipeline_loader(DummyDiffusionPipeline.loader)
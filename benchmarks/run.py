@@ -0,0 +1,309 @@
+# Offline benchmark suite for the quote → PDF pipeline (stub LLM, stub diffusion, real data/*.csv).
+"""
+Usage (from the repository root):
+    python -m benchmarks.run                          # all cases → benchmarks/results/<time>_<commit>.json
+    python -m benchmarks.run --only render_story_page_10p pdf_export_50p
+    python -m benchmarks.run --baseline benchmarks/results/<file>.json --threshold 1.2
+With --baseline, cases whose median is more than `threshold` × the baseline median
+are reported as regressions and the exit code is 1.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+
+from benchmarks.fixtures import make_story, make_story_dir, install_stubs  # noqa: E402
+
+DATA_PKS = "data/TuThu_PKS_007.csv"
+DATA_BINH = "data/TuThu_BinhGiai_PKS_007.csv"
+DATA_STYLE = "data/TuThu_Data_Example.csv"
+
+CASES = {}  # name → (setup(tmp_dir) → (callable, items), repeat)
+
+
+class SkipCase(Exception):
+    """Raised by a setup when the case cannot run here (e.g. torch not installed)."""
+
+
+def case(name, repeat=5):
+    def register(setup):
+        CASES[name] = (setup, repeat)
+        return setup
+    return register
+
+
+@contextlib.contextmanager
+def _quiet():
+    """The pipeline prints/logs per call; keep that out of the timings and the console."""
+    logging.disable(logging.INFO)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def _corpus():
+    from src.corpus_store import get_corpus
+    return get_corpus(DATA_PKS, DATA_BINH, DATA_STYLE)
+
+
+# ===============================
+# CASES
+# ===============================
+@case("load_corpus_cold", repeat=3)
+def bench_load_corpus(tmp):
+    from src.corpus_store import clear_corpus_cache
+
+    def run():
+        clear_corpus_cache()
+        _corpus()
+    return run, 1
+
+
+@case("find_id_from_quote_all")
+def bench_find_id(tmp):
+    from src.data_utils import find_id_from_quote
+    from src.columnar import text_values
+    corpus = _corpus()
+    df_pks = corpus.frames()[0]
+    quotes = [q for col in ("C", "V", "M") for q in text_values(df_pks, col) if q]
+
+    def run():
+        for q in quotes:
+            find_id_from_quote(q, df_pks, index=corpus.quote_index)
+    return run, len(quotes)
+
+
+@case("get_binhgiai_from_id_all")
+def bench_binhgiai(tmp):
+    from src.data_utils import get_binhgiai_from_id
+    from src.columnar import text_values
+    corpus = _corpus()
+    df_pks, df_binh, _ = corpus.frames()
+    ids = text_values(df_pks, "sent_id")
+
+    def run():
+        for i in ids:
+            get_binhgiai_from_id(i, df_binh, index=corpus.commentary_index)
+    return run, len(ids)
+
+
+def _render_case(n_pages):
+    def setup(tmp):
+        from src.render_story_page import render_story_page
+        json_path = make_story_dir(tmp, n_pages)
+
+        def run():
+            render_story_page(json_path, tmp, output_pdf=False, incremental=False)
+        return run, n_pages
+    return setup
+
+
+for _pages in (2, 10, 50):
+    case(f"render_story_page_{_pages}p", repeat=3)(_render_case(_pages))
+
+
+@case("pdf_export_50p", repeat=3)
+def bench_pdf_export(tmp):
+    """PDF streaming only: every page comes from the page cache after a warm-up render."""
+    from src.render_story_page import render_story_page
+    json_path = make_story_dir(tmp, 50)
+    render_story_page(json_path, tmp, output_pdf=False)
+
+    def run():
+        meta = render_story_page(json_path, tmp, output_pdf=True)
+        assert meta["pages_rendered"] == 0 and meta["pdf_path"]
+    return run, 50
+
+
+def _story_log_entries(n):
+    stories = [make_story(4, title=f"Story {k}") for k in range(100)]  # 100 distinct storyboards
+    return [(f"PKS_007.{k % 84:03d}", f"quote {k % 84}", f"Story {k % 100}", stories[k % 100])
+            for k in range(n)]
+
+
+@case("append_story_log_10k", repeat=1)
+def bench_story_log(tmp):
+    from src.log_prompt_history import append_story_log
+    entries = _story_log_entries(10_000)
+
+    def run():
+        log_dir = tempfile.mkdtemp(dir=tmp)
+        for story_id, quote, title, story in entries:
+            append_story_log(quote, story_id, title, output_dir=log_dir, story=story, background=False)
+    return run, len(entries)
+
+
+@case("append_story_log_10k_background", repeat=1)
+def bench_story_log_background(tmp):
+    from src.log_prompt_history import append_story_log
+    from src.log_writer import get_log_writer
+    entries = _story_log_entries(10_000)
+
+    def run():
+        log_dir = tempfile.mkdtemp(dir=tmp)
+        for story_id, quote, title, story in entries:
+            append_story_log(quote, story_id, title, output_dir=log_dir, story=story, background=True)
+        get_log_writer(os.path.join(log_dir, "story_log.sqlite")).flush()
+    return run, len(entries)
+
+
+@case("run_pipeline_stub", repeat=3)
+def bench_run_pipeline(tmp):
+    """Full quote → storyboard → panels → PDF with the stub LLM and DummyDiffusionPipeline."""
+    try:
+        from src import main_pipeline
+        from src.main_pipeline import run_pipeline
+    except ImportError as e:  # torch / diffusers missing
+        raise SkipCase(f"pipeline import failed: {e}")
+    main_pipeline.PREGENERATED_ENABLED = False  # time the live pipeline, not a pregenerated copy
+    install_stubs(make_story(8))
+    os.environ["FAST_MODE"] = "false"
+    _corpus()  # the corpus load is measured by load_corpus_cold
+
+    def run():
+        out = tempfile.mkdtemp(dir=tmp)
+        run_pipeline("康誥曰：克明德。", stream=False, output_dir=out)
+    return run, 1
+
+
+# ===============================
+# RUNNER
+# ===============================
+def run_case(name, repeat=None):
+    setup, default_repeat = CASES[name]
+    repeat = repeat or default_repeat
+    tmp = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        with _quiet():
+            fn, items = setup(tmp)
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - t0)
+    except SkipCase as e:
+        return {"skipped": str(e)}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    median = statistics.median(times)
+    return {
+        "repeat": repeat,
+        "items": items,
+        "min_s": min(times),
+        "median_s": median,
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "per_item_ms": median / items * 1000 if items else None,
+    }
+
+
+def environment():
+    def version(mod):
+        try:
+            return __import__(mod).__version__
+        except Exception:
+            return None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "render_workers": os.getenv("RENDER_WORKERS"),
+        "packages": {m: version(m) for m in ("pandas", "numpy", "rapidfuzz", "PIL", "torch")},
+    }
+
+
+def compare(results, baseline, threshold):
+    """Rows of (case, baseline median, current median, ratio, status); status is ok/REGRESSION/faster/new."""
+    rows = []
+    for name, res in results["cases"].items():
+        if "median_s" not in res:
+            continue
+        base = baseline.get("cases", {}).get(name, {})
+        if "median_s" not in base:
+            rows.append((name, None, res["median_s"], None, "new"))
+            continue
+        ratio = res["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        status = "REGRESSION" if ratio > threshold else ("faster" if ratio < 1 / threshold else "ok")
+        rows.append((name, base["median_s"], res["median_s"], ratio, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline quote → PDF benchmarks")
+    parser.add_argument("--only", nargs="+", metavar="CASE", help=f"cases to run: {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, help="override the per-case repeat count")
+    parser.add_argument("--out", help="result JSON path (default benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--baseline", help="result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="median ratio above which a case counts as a regression (default 1.2)")
+    args = parser.parse_args(argv)
+
+    # Before any src import: the caches read these at import time, and
+    # src/main_pipeline resolves data/*.csv relative to the repository root
+    os.chdir(ROOT)
+    os.environ.setdefault("LLM_CACHE", "false")
+    os.environ.setdefault("PANEL_CACHE", "false")
+
+    names = args.only or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    results = {"created": datetime.now().isoformat(timespec="seconds"), "environment": environment(), "cases": {}}
+    for name in names:
+        print(f"⏱️ {name} …", end=" ", flush=True)
+        res = run_case(name, args.repeat)
+        results["cases"][name] = res
+        if "skipped" in res:
+            print(f"skipped ({res['skipped']})")
+        else:
+            print(f"median {res['median_s']:.3f}s ({res['per_item_ms']:.2f} ms/item, n={res['repeat']})")
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['environment']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"📄 Results → {out}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.threshold)
+    print(f"\nvs {args.baseline} (commit {baseline.get('environment', {}).get('commit')}), threshold {args.threshold}×")
+    for name, base, cur, ratio, status in rows:
+        base_s = f"{base:.3f}s" if base is not None else "-"
+        ratio_s = f"{ratio:.2f}×" if ratio is not None else "-"
+        print(f"  {name:<36} {base_s:>10} → {cur:.3f}s  {ratio_s:>7}  {status}")
+    regressions = [r for r in rows if r[4] == "REGRESSION"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s)")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
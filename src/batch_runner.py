@@ -0,0 +1,171 @@
+# Asynchronous multi-quote pipeline runner with bounded concurrency per stage.
+import os
+import re
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .main_pipeline import prepare_context, call_gemini, save_storyboard
+from .generate_flux_images import generate_flux_images
+from .render_story_page import render_story_page, setup_logging
+from .tracing import span, trace_parent, call_traced, adopt_spans
+
+_DIFFUSION_DONE = object()
+
+
+def _safe_name(text):
+    return re.sub(r"[^\w.-]+", "_", str(text)).strip("_") or "story"
+
+
+def _generate(prompts, output_dir):
+    with span("generate_flux_images", panels=len(prompts)):
+        generate_flux_images(prompts, output_dir)
+
+
+async def _diffusion_consumer(jobs, executor):
+    """
+    Single consumer: one diffusion job at a time on the GPU/CPU. Each job carries
+    its quote's contextvars (run_in_executor doesn't copy them), so the diffusion
+    spans land in that quote's trace.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await jobs.get()
+        if job is _DIFFUSION_DONE:
+            return
+        prompts, output_dir, fut, ctx = job
+        if fut.done():  # its quote was cancelled while queued
+            continue
+        try:
+            t0 = time.perf_counter()
+            await loop.run_in_executor(executor, ctx.run, _generate, prompts, output_dir)
+            result = time.perf_counter() - t0
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+            continue
+        # the waiting quote may have been cancelled meanwhile
+        if not fut.done():
+            fut.set_result(result)
+
+
+async def _run_one(index, quote, output_root, llm_sem, jobs, layout_pool, output_pdf):
+    # one trace per quote: asyncio.to_thread copies the span context, the diffusion
+    # thread and the layout process pool get it passed explicitly
+    with span("batch_pipeline", index=index):
+        return await _run_stages(index, quote, output_root, llm_sem, jobs, layout_pool, output_pdf)
+
+
+async def _run_stages(index, quote, output_root, llm_sem, jobs, layout_pool, output_pdf):
+    loop = asyncio.get_running_loop()
+    result = {"index": index, "quote": quote, "id": None, "output_dir": None,
+              "pdf_path": None, "timings": {}, "error": None}
+    timings = result["timings"]
+    stage = "context"
+    try:
+        t0 = time.perf_counter()
+        id_value, context = await asyncio.to_thread(prepare_context, quote)
+        timings["context"] = time.perf_counter() - t0
+        result["id"] = id_value
+        output_dir = os.path.join(output_root, f"{index:03d}_{_safe_name(id_value)}")
+        result["output_dir"] = output_dir
+
+        stage = "llm"
+        async with llm_sem:
+            t0 = time.perf_counter()
+            with span("call_gemini"):
+                story = await asyncio.to_thread(call_gemini, context)
+            timings["llm"] = time.perf_counter() - t0
+
+        stage = "storyboard"
+        t0 = time.perf_counter()
+        json_path = await asyncio.to_thread(save_storyboard, story, id_value, context, output_dir)
+        timings["storyboard"] = time.perf_counter() - t0
+
+        if "image_prompts" not in story:
+            return result
+
+        stage = "diffusion"
+        fut = loop.create_future()
+        t0 = time.perf_counter()
+        await jobs.put((story["image_prompts"], output_dir, fut, contextvars.copy_context()))
+        timings["diffusion"] = await fut
+        timings["diffusion_wait"] = time.perf_counter() - t0 - timings["diffusion"]
+
+        stage = "layout"
+        t0 = time.perf_counter()
+        # contextvars don't reach the process pool: pass the trace explicitly, adopt its spans here
+        meta, spans = await loop.run_in_executor(layout_pool, call_traced, trace_parent(), "render_story_page",
+                                                 render_story_page, json_path, output_dir, output_pdf)
+        adopt_spans(spans)
+        timings["layout"] = time.perf_counter() - t0
+        if meta:
+            result["pdf_path"] = meta.get("pdf_path")
+    except Exception as e:
+        result["error"] = f"{stage}: {e}"
+    return result
+
+
+async def run_pipelines(quotes, llm_concurrency=4, render_workers=2,
+                        output_root="outputs/batch", output_pdf=True):
+    """
+    Run the full pipeline for many quotes; async generator yielding one result
+    dict per quote as soon as it finishes (progress/result stream):
+        {"index", "quote", "id", "output_dir", "pdf_path", "timings", "error"}
+    - LLM calls run concurrently, at most `llm_concurrency` in flight
+    - diffusion runs on a single-consumer queue (one job at a time)
+    - page layout runs in a process pool with `render_workers` processes
+    - each quote writes to its own <output_root>/<index>_<id>/ directory
+    """
+    os.makedirs(output_root, exist_ok=True)
+    llm_sem = asyncio.Semaphore(llm_concurrency)
+    jobs = asyncio.Queue()
+
+    diffusion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diffusion")
+    layout_pool = ProcessPoolExecutor(max_workers=render_workers)
+    consumer = asyncio.create_task(_diffusion_consumer(jobs, diffusion_executor))
+    tasks = []
+    try:
+        tasks = [
+            asyncio.create_task(_run_one(i, q, output_root, llm_sem, jobs, layout_pool, output_pdf))
+            for i, q in enumerate(quotes, start=1)
+        ]
+        for done in asyncio.as_completed(tasks):
+            result = await done
+            status = "❌ " + result["error"] if result["error"] else "✅"
+            stage_times = ", ".join(f"{k}={v:.1f}s" for k, v in result["timings"].items())
+            print(f"[{result['index']}/{len(tasks)}] {status} {result['id']} ({stage_times})")
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await jobs.put(_DIFFUSION_DONE)
+        await consumer
+        diffusion_executor.shutdown(wait=True)
+        layout_pool.shutdown(wait=True)
+
+
+def run_pipelines_sync(quotes, **kwargs):
+    """Blocking helper: run every quote and return results ordered by input index."""
+    async def _collect():
+        return [r async for r in run_pipelines(quotes, **kwargs)]
+    return sorted(asyncio.run(_collect()), key=lambda r: r["index"])
+
+
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+    from .main_pipeline import DATA_PKS
+
+    parser = argparse.ArgumentParser(description="Generate a comic for many quotes.")
+    parser.add_argument("quotes", nargs="*", help="Quotes to render (default: every sentence in column C)")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--render-workers", type=int, default=2)
+    parser.add_argument("--output-root", default="outputs/batch")
+    args = parser.parse_args()
+    setup_logging()
+
+    quotes = args.quotes or pd.read_csv(DATA_PKS)["C"].dropna().astype(str).tolist()
+    run_pipelines_sync(quotes, llm_concurrency=args.llm_concurrency,
+                       render_workers=args.render_workers, output_root=args.output_root)
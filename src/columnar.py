@@ -0,0 +1,339 @@
+# Memory-mapped columnar corpus tables (custom string-offset format) compiled from the CSVs.
+"""
+File layout of <stem>.tucol (little-endian, buffers 8-byte aligned):
+
+    b"TUCOL\\x00\\x00\\x01"       magic + format version
+    uint64                      header length
+    header                      UTF-8 JSON: rows, source signature, column specs
+    buffers                     per column, see below
+
+Column kinds:
+    str       offsets int64[rows + 1] into a UTF-8 data buffer, nulls uint8[rows]
+    category  codes int32[rows] (-1 = null) + a `str` dictionary column; stored for
+              low-cardinality text (ids) and restored as object or category dtype
+    num       one fixed-width NumPy array (int64 / float64 / bool)
+
+Tables are opened with np.memmap, so every process reading the same file shares
+the same page-cache pages; strings are only decoded for the rows that are used.
+"""
+import os
+import json
+import struct
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+from .quote_index import source_signature
+
+MAGIC = b"TUCOL\x00\x00\x01"
+FORMAT_VERSION = 2  # 2: column names cleaned with clean_column_name
+SUFFIX = ".tucol"
+
+
+def clean_column_name(name):
+    """Strip whitespace and the stray double quotes some exported headers carry (' "Nhân vật"')."""
+    return str(name).strip().strip('"').strip()
+
+
+def default_table_path(csv_path):
+    root, _ = os.path.splitext(csv_path)
+    return root + SUFFIX
+
+
+# ===============================
+# WRITER
+# ===============================
+class _BufferWriter:
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, data):
+        """Append bytes (8-byte aligned); returns [offset, length] relative to the buffer area."""
+        pad = (-self.size) % 8
+        if pad:
+            self.parts.append(b"\x00" * pad)
+            self.size += pad
+        pos = self.size
+        self.parts.append(data)
+        self.size += len(data)
+        return [pos, len(data)]
+
+
+def _string_spec(values, buf):
+    encoded = [b"" if v is None else v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return {
+        "kind": "str",
+        "offsets": buf.add(offsets.tobytes()),
+        "data": buf.add(b"".join(encoded)),
+        "nulls": buf.add(np.array([v is None for v in values], dtype=np.uint8).tobytes()),
+    }
+
+
+def _as_optional_str(series):
+    return [None if pd.isna(v) else str(v) for v in series.tolist()]
+
+
+def write_table(df, path, source=None, categories=None):
+    """
+    Write a DataFrame as a .tucol file. Numeric/bool columns are stored as fixed-width
+    arrays; text columns as `category` when listed in `categories`, already categorical,
+    or at most half of their values are distinct – otherwise as `str`.
+    """
+    categories = set(categories or ())
+    buf = _BufferWriter()
+    specs = []
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_bool_dtype(col) or pd.api.types.is_numeric_dtype(col):
+            arr = np.ascontiguousarray(col.to_numpy())
+            spec = {"kind": "num", "dtype": arr.dtype.str, "data": buf.add(arr.tobytes())}
+        else:
+            is_cat = isinstance(col.dtype, pd.CategoricalDtype)
+            if is_cat or name in categories or col.nunique(dropna=True) * 2 <= len(col):
+                cat = col if is_cat else col.astype("category")
+                dictionary = [str(c) for c in cat.cat.categories]
+                codes = cat.cat.codes.to_numpy().astype("<i4")
+                spec = {"kind": "category", "codes": buf.add(codes.tobytes()),
+                        "dictionary": _string_spec(dictionary, buf), "size": len(dictionary),
+                        "pandas": "category" if is_cat else "object"}
+            else:
+                spec = _string_spec(_as_optional_str(col), buf)
+        spec["name"] = str(name)
+        specs.append(spec)
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "rows": len(df),
+        "source": [list(s) for s in source] if source else None,
+        "columns": specs,
+    }, ensure_ascii=False).encode("utf-8")
+    header += b" " * ((-len(header)) % 8)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for part in buf.parts:
+            f.write(part)
+    os.replace(tmp, path)
+
+
+def compile_csv(csv_path, table_path=None, categories=None):
+    """CSV → .tucol next to it (column names cleaned, as load_all does). Returns the path."""
+    table_path = table_path or default_table_path(csv_path)
+    df = pd.read_csv(csv_path)
+    df.columns = [clean_column_name(c) for c in df.columns]
+    write_table(df, table_path, source=source_signature([csv_path]), categories=categories)
+    return table_path
+
+
+# ===============================
+# READER
+# ===============================
+class StringColumn:
+    """Lazily decoded UTF-8 strings backed by the memory map."""
+
+    def __init__(self, mm, base, spec, rows):
+        pos, _ = spec["offsets"]
+        self.offsets = np.frombuffer(mm, dtype="<i8", count=rows + 1, offset=base + pos)
+        dpos, dlen = spec["data"]
+        self.data = mm[base + dpos: base + dpos + dlen]
+        npos, _ = spec["nulls"]
+        self.nulls = np.frombuffer(mm, dtype=np.uint8, count=rows, offset=base + npos)
+
+    def __len__(self):
+        return len(self.nulls)
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
+
+
+class CategoryColumn:
+    """int32 codes + a decoded dictionary (dictionaries are small: ids, labels)."""
+
+    def __init__(self, mm, base, spec, rows):
+        pos, _ = spec["codes"]
+        self.codes = np.frombuffer(mm, dtype="<i4", count=rows, offset=base + pos)
+        self.dictionary = StringColumn(mm, base, spec["dictionary"], spec["size"]).to_list()
+        self._code_of = {v: i for i, v in enumerate(self.dictionary)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.dictionary[code]
+
+    def rows_equal(self, value):
+        """Row numbers whose value == value (a NumPy comparison on the codes)."""
+        code = self._code_of.get(str(value))
+        return np.flatnonzero(self.codes == code) if code is not None else np.array([], dtype=np.int64)
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
+
+
+class NumericColumn:
+    def __init__(self, mm, base, spec, rows):
+        pos, _ = spec["data"]
+        self.values = np.frombuffer(mm, dtype=np.dtype(spec["dtype"]), count=rows, offset=base + pos)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i].item()
+
+    def to_list(self):
+        return self.values.tolist()
+
+
+_COLUMN_TYPES = {"str": StringColumn, "category": CategoryColumn, "num": NumericColumn}
+
+
+class RowView(Mapping):
+    """Read-only dict-like row; each field is decoded on access."""
+
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, name):
+        return self._table.column(name)[self._i]
+
+    def __iter__(self):
+        return iter(self._table.columns)
+
+    def __len__(self):
+        return len(self._table.columns)
+
+    def to_dict(self):
+        return {name: self[name] for name in self._table.columns}
+
+
+class _ILoc:
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, i):
+        return RowView(self._table, int(i))
+
+
+class ColumnarTable:
+    """
+    Memory-mapped .tucol table. Offers the small part of the DataFrame API the
+    pipeline uses (`columns`, `len()`, `iloc[i]` → RowView, `to_dict("records")`)
+    plus to_pandas() for everything else.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._mm[:8]) != MAGIC:
+            raise ValueError(f"{path} is not a {SUFFIX} file")
+        (header_len,) = struct.unpack("<Q", bytes(self._mm[8:16]))
+        header = json.loads(bytes(self._mm[16:16 + header_len]).decode("utf-8"))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported format version {header.get('version')}")
+        base = 16 + header_len
+        self.rows = header["rows"]
+        self.source = header.get("source")
+        self._specs = {spec["name"]: spec for spec in header["columns"]}
+        self.columns = [spec["name"] for spec in header["columns"]]
+        self._columns = {
+            name: _COLUMN_TYPES[spec["kind"]](self._mm, base, spec, self.rows)
+            for name, spec in self._specs.items()
+        }
+        self.iloc = _ILoc(self)
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        return self._columns[name]
+
+    def row(self, i):
+        return RowView(self, i)
+
+    def iter_rows(self):
+        return (RowView(self, i) for i in range(self.rows))
+
+    def to_dict(self, orient="records"):
+        if orient != "records":
+            raise ValueError("ColumnarTable.to_dict only supports orient='records'")
+        return list(self.iter_rows())
+
+    def to_pandas(self, columns=None):
+        """Materialize (some of) the table as a DataFrame equal to pd.read_csv + stripped names."""
+        data = {}
+        for name in columns or self.columns:
+            col = self._columns[name]
+            if isinstance(col, CategoryColumn):
+                cat = pd.Categorical.from_codes(np.array(col.codes), categories=col.dictionary)
+                data[name] = cat if self._specs[name]["pandas"] == "category" else np.asarray(cat, dtype=object)
+            elif isinstance(col, NumericColumn):
+                data[name] = np.array(col.values)
+            else:
+                data[name] = np.array([np.nan if v is None else v for v in col.to_list()], dtype=object)
+        return pd.DataFrame(data, columns=list(columns or self.columns))
+
+
+def column_values(table, name):
+    """One column of a DataFrame or ColumnarTable as a list; nulls (NaN/None) become None."""
+    if isinstance(table, ColumnarTable):
+        return table.column(name).to_list()
+    return [None if pd.isna(v) else v for v in table[name].tolist()]
+
+
+def text_values(table, name):
+    """column_values as strings with nulls as "" (like .fillna("").astype(str))."""
+    return ["" if v is None else str(v) for v in column_values(table, name)]
+
+
+def open_table(csv_path, table_path=None):
+    """The compiled table for csv_path, or None when it is missing or older than the CSV."""
+    table_path = table_path or default_table_path(csv_path)
+    if not os.path.exists(table_path):
+        return None
+    try:
+        table = ColumnarTable(table_path)
+    except (OSError, ValueError):
+        return None
+    if table.source != [list(s) for s in source_signature([csv_path])]:
+        return None
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Compile corpus CSVs into memory-mapped .tucol tables")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_compile = sub.add_parser("compile", help="CSV → <stem>.tucol (default: data/*.csv)")
+    p_compile.add_argument("csv", nargs="*")
+    p_info = sub.add_parser("info", help="Show the columns of a .tucol file")
+    p_info.add_argument("table")
+    args = parser.parse_args()
+
+    if args.cmd == "compile":
+        for csv_path in args.csv or sorted(glob.glob("data/*.csv")):
+            out = compile_csv(csv_path)
+            print(f"🗜️ {csv_path} → {out} ({os.path.getsize(out) / 1024:.0f} KB)")
+    else:
+        t = ColumnarTable(args.table)
+        print(f"{t.path}: {t.rows} rows")
+        for name in t.columns:
+            spec = t._specs[name]
+            extra = f" ({spec['size']} values)" if spec["kind"] == "category" else ""
+            print(f"  {name:<32} {spec['kind']}{extra}")
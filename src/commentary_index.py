@@ -0,0 +1,66 @@
+# Hash index over commentary ids (sect_id) with hierarchical fallback.
+from collections import Counter
+from rapidfuzz import process, fuzz
+
+ID_SEP = "."
+
+
+class CommentaryIndex:
+    """
+    O(1) lookup of TuThu_BinhGiai_PKS_007.csv rows by id.
+    Ids are hierarchical (PKS_007 → PKS_007.002 → PKS_007.002.001), so a miss is
+    resolved in tiers:
+      1. exact     – the id itself
+      2. prefix    – nearest ancestor (drop trailing segments), or the first
+                     descendant when a shorter id (e.g. a file id) is given
+      3. fuzzy     – partial_ratio over all ids (previous behaviour)
+    `stats` counts which tier served each lookup.
+    """
+
+    def __init__(self, rows, id_col="sect_id"):
+        self.id_col = id_col
+        self.rows = {}
+        self.children = {}
+        for row in rows:
+            key = str(row.get(id_col))
+            if key in self.rows:
+                continue
+            self.rows[key] = row
+            # Register every proper ancestor → first descendant (file order).
+            parts = key.split(ID_SEP)
+            for n in range(1, len(parts)):
+                self.children.setdefault(ID_SEP.join(parts[:n]), key)
+        self.ids = list(self.rows)
+        self.stats = Counter()
+
+    @classmethod
+    def from_dataframe(cls, df_binh, id_col="sect_id"):
+        return cls(df_binh.to_dict("records"), id_col=id_col)
+
+    def lookup(self, id_value):
+        """Return (row, tier, score) or (None, "miss", 0)."""
+        key = str(id_value)
+
+        row = self.rows.get(key)
+        if row is not None:
+            self.stats["exact"] += 1
+            return row, "exact", 100.0
+
+        parts = key.split(ID_SEP)
+        for n in range(len(parts) - 1, 0, -1):
+            row = self.rows.get(ID_SEP.join(parts[:n]))
+            if row is not None:
+                self.stats["prefix"] += 1
+                return row, "prefix", 100.0
+        child = self.children.get(key)
+        if child is not None:
+            self.stats["prefix"] += 1
+            return self.rows[child], "prefix", 100.0
+
+        if self.ids:
+            _, score, idx = process.extractOne(key, self.ids, scorer=fuzz.partial_ratio)
+            self.stats["fuzzy"] += 1
+            return self.rows[self.ids[idx]], "fuzzy", score
+
+        self.stats["miss"] += 1
+        return None, "miss", 0
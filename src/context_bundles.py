@@ -0,0 +1,165 @@
+# Precompiled per-sentence LLM contexts: build_context for every sent_id, done once offline.
+import os
+import json
+import threading
+from collections import Counter
+from .data_utils import commentary_fields, build_context, match_style_row
+from .quote_index import source_signature
+
+BUNDLE_VERSION = 3
+CONTEXT_FIELDS = ("quote", "binh_giai", "y_nghia", "boi_canh", "nhan_vat", "prompt_mau")
+REQUIRED_FIELDS = ("quote", "binh_giai", "y_nghia")  # sentence-specific; style fields may fall back
+
+
+def default_bundle_path(pks_path):
+    root, _ = os.path.splitext(pks_path)
+    return root + ".contexts.json"
+
+
+def compile_bundles(corpus):
+    """
+    Run the request-time lookups (commentary + build_context) for every sent_id of
+    the corpus. Returns (contexts, report, commentary_ids): contexts maps sent_id →
+    the exact dict build_context returns; report lists every fallback that was hit;
+    commentary_ids maps sent_id → the id of the commentary row it resolved to.
+    """
+    _, df_binh, df_style = corpus.frames()
+    index = corpus.commentary_index
+    id_col = "sect_id" if "sect_id" in df_binh.columns else "ID"
+    contexts = {}
+    commentary_ids = {}
+    report = {"sentences": 0, "style_fallback": [], "commentary_tier": {}, "errors": {},
+              "empty_fields": Counter(), "missing_required": {}}
+    for sent_id, row_pks in corpus.sent_rows.items():
+        report["sentences"] += 1
+        row, tier, _ = index.lookup(sent_id)  # once: lookup() counts into index.stats
+        if row is None:
+            report["errors"][sent_id] = f"No E (Bình Giải) found for {sent_id}."
+            row_binh = {}
+        else:
+            row_binh = commentary_fields(row, id_col)
+            commentary_ids[sent_id] = str(row_binh["id"])
+        if tier != "exact":
+            report["commentary_tier"][sent_id] = tier
+        if match_style_row(sent_id, df_style) is None:
+            report["style_fallback"].append(sent_id)
+        context = build_context(sent_id, df_style, row_binh, row_pks)
+        for field in CONTEXT_FIELDS:
+            if not context.get(field):
+                report["empty_fields"][field] += 1
+                if field in REQUIRED_FIELDS:
+                    report["missing_required"].setdefault(sent_id, []).append(field)
+        contexts[sent_id] = context
+    report["empty_fields"] = dict(report["empty_fields"])
+    return contexts, report, commentary_ids
+
+
+def save_bundles(contexts, report, path, source, commentary_ids=None):
+    """
+    Write the bundle file. A section commentary is shared by all its sentences, so
+    it is stored once under "commentaries" (commentary id → text) and each context
+    names it in "binh_giai_ref" instead of repeating the text.
+    """
+    commentary_ids = commentary_ids or {}
+    commentaries, packed = {}, {}
+    for sent_id, context in contexts.items():
+        ref = commentary_ids.get(sent_id)
+        if ref is not None and commentaries.setdefault(ref, context["binh_giai"]) == context["binh_giai"]:
+            context = {k: v for k, v in context.items() if k != "binh_giai"}
+            context["binh_giai_ref"] = ref
+        packed[sent_id] = context
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": BUNDLE_VERSION, "source": [list(s) for s in source],
+                   "report": report, "commentaries": commentaries, "contexts": packed},
+                  f, ensure_ascii=False, separators=(",", ":"), default=str)
+    os.replace(tmp, path)
+
+
+def load_bundles(path, source):
+    """sent_id → context dict, or None when the file is missing, stale or from another version."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != BUNDLE_VERSION or data.get("source") != [list(s) for s in source]:
+        return None
+    commentaries = data["commentaries"]
+    contexts = data["contexts"]
+    for context in contexts.values():
+        ref = context.pop("binh_giai_ref", None)
+        if ref is not None:
+            context["binh_giai"] = commentaries[ref]  # one shared str per commentary
+    return contexts
+
+
+def print_report(report):
+    n = report["sentences"]
+    print(f"📦 {n} sentence contexts compiled")
+    if report["style_fallback"]:
+        ids = report["style_fallback"]
+        print(f"⚠️ style fallback (no STT match → first style row) for {len(ids)}/{n}: "
+              f"{', '.join(ids[:5])}{' …' if len(ids) > 5 else ''}")
+    tiers = Counter(report["commentary_tier"].values())
+    for tier, count in sorted(tiers.items()):
+        mark = "ℹ️" if tier == "prefix" else "⚠️"  # prefix = the sentence's own section, as expected
+        print(f"{mark} commentary resolved by {tier} match for {count}/{n} sentences")
+    for sent_id, err in report["errors"].items():
+        print(f"❌ {sent_id}: {err}")
+    for field, count in sorted(report["empty_fields"].items()):
+        print(f"⚠️ '{field}' is empty for {count}/{n} sentences")
+    for sent_id, fields in report["missing_required"].items():
+        print(f"❌ {sent_id}: no {', '.join(fields)}")
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def get_context_bundles(pks_path, binh_path, style_path, bundle_path=None):
+    """Process-wide bundles for these CSVs (loaded once); None until they are compiled."""
+    bundle_path = bundle_path or default_bundle_path(pks_path)
+    source = source_signature([pks_path, binh_path, style_path])
+    key = os.path.abspath(bundle_path)
+    with _loaded_lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached[0] == source:
+            return cached[1]
+        contexts = load_bundles(bundle_path, source)
+        if contexts is not None:
+            _loaded[key] = (source, contexts)
+        return contexts
+
+
+if __name__ == "__main__":
+    import io
+    import argparse
+    import contextlib
+    from .corpus_store import get_corpus
+
+    parser = argparse.ArgumentParser(description="Compile per-sentence LLM contexts")
+    parser.add_argument("--pks", default="data/TuThu_PKS_007.csv")
+    parser.add_argument("--binh", default="data/TuThu_BinhGiai_PKS_007.csv")
+    parser.add_argument("--style", default="data/TuThu_Data_Example.csv")
+    parser.add_argument("--out")
+    parser.add_argument("--allow-style-fallback", action="store_true",
+                        help="Write bundles even when sentences have no style row of their own "
+                             "(they all get the first row's setting, characters and prompt seed)")
+    args = parser.parse_args()
+
+    corpus = get_corpus(args.pks, args.binh, args.style)
+    with contextlib.redirect_stdout(io.StringIO()):  # per-lookup prints; the report summarizes them
+        contexts, report, commentary_ids = compile_bundles(corpus)
+    print_report(report)
+    if report["missing_required"]:
+        # an empty quote/commentary/meaning would give every such sentence the same prompt
+        raise SystemExit(f"❌ {len(report['missing_required'])} sentences lack required fields – "
+                         f"bundles not written")
+    if report["style_fallback"] and not args.allow_style_fallback:
+        # the fallback style row would be baked into every such sentence's prompt
+        raise SystemExit(f"❌ {len(report['style_fallback'])} sentences have no STT match in {args.style} – "
+                         f"add style rows for them or pass --allow-style-fallback; bundles not written")
+    out = args.out or default_bundle_path(args.pks)
+    save_bundles(contexts, report, out, source_signature([args.pks, args.binh, args.style]), commentary_ids)
+    print(f"💾 Saved {out} ({os.path.getsize(out) / 1024:.0f} KB)")
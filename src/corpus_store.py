@@ -0,0 +1,146 @@
+# Process-wide corpus store: parse the CSVs once, reuse them across requests.
+import os
+import hashlib
+import threading
+from .quote_index import load_quote_index, source_signature
+from .commentary_index import CommentaryIndex
+from .semantic_index import load_semantic_index
+from .columnar import ColumnarTable
+from .data_utils import read_table
+
+# Explicit dtypes (applied after column names are stripped).
+# Ids repeat a lot → categorical; everything else stays as plain text.
+PKS_DTYPES = {"file_id": "category", "sect_id": "category"}
+BINH_DTYPES = {"file_id": "category", "sect_id": "category"}
+STYLE_DTYPES = {}
+
+_CACHE = {}
+_HASHES = {}    # abspath → (stat key, SHA-256) so check="hash" only re-reads files that changed
+_LOCK = threading.Lock()
+
+
+class Corpus:
+    """
+    Loaded, typed corpus plus pre-built lookups:
+    - sent_rows:  sent_id → row dict of TuThu_PKS_007.csv
+    - commentary_index: CommentaryIndex for get_binhgiai_from_id
+    - quote_index: QuoteIndex for find_id_from_quote
+    - semantic_index: optional SemanticIndex, memory-mapped on first access
+    - context_bundles: optional sent_id → precompiled build_context dict
+    Each frame is a ColumnarTable (dict-like rows, see src/columnar.py) when its
+    <stem>.tucol has been compiled, a DataFrame otherwise.
+    """
+
+    def __init__(self, df_pks, df_binh, df_style, signature):
+        self.df_pks = df_pks
+        self.df_binh = df_binh
+        self.df_style = df_style
+        self.signature = signature
+
+        self.sent_rows = {}
+        if "sent_id" in df_pks.columns:
+            for row in df_pks.to_dict("records"):
+                self.sent_rows.setdefault(str(row["sent_id"]), row)
+
+        id_col = "sect_id" if "sect_id" in df_binh.columns else "ID"
+        self.commentary_index = CommentaryIndex.from_dataframe(df_binh, id_col=id_col)
+
+        self.quote_index = None
+        self.paths = None
+        self._semantic_index = None
+        self._semantic_loaded = False
+
+    @property
+    def context_bundles(self):
+        """sent_id → precompiled context (python -m src.context_bundles), or None."""
+        from .context_bundles import get_context_bundles
+        return get_context_bundles(*self.paths)
+
+    @property
+    def semantic_index(self):
+        """Loaded lazily (only hybrid quote matching needs it); None when not built."""
+        if not self._semantic_loaded:
+            with _LOCK:
+                if not self._semantic_loaded:
+                    self._semantic_index = load_semantic_index(self.paths[0], self.paths[1], self.df_pks)
+                    self._semantic_loaded = True
+        return self._semantic_index
+
+    def frames(self):
+        return self.df_pks, self.df_binh, self.df_style
+
+
+def _read_typed(path, dtypes):
+    df = read_table(path)
+    if isinstance(df, ColumnarTable):
+        return df  # ids are already stored as categories
+    for col, dtype in dtypes.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _file_hash(path):
+    """
+    SHA-256 of one file, cached by its stat. The key includes ctime and inode next to
+    (mtime, size): replacing or rewriting a file updates those even when mtime is preserved.
+    """
+    st = os.stat(path)
+    stat_key = (st.st_mtime_ns, st.st_size, st.st_ctime_ns, st.st_ino)
+    path = os.path.abspath(path)
+    cached = _HASHES.get(path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    _HASHES[path] = (stat_key, h.hexdigest())
+    return h.hexdigest()
+
+
+def _content_hash(paths):
+    return hashlib.sha256("".join(_file_hash(p) for p in paths).encode("ascii")).hexdigest()
+
+
+def _signature(paths, check):
+    if check == "hash":
+        return _content_hash(paths)
+    return source_signature(paths)
+
+
+def get_corpus(pks_path, binh_path, style_path, check="mtime"):
+    """
+    Return the cached Corpus for these three files, reloading only when they changed.
+    check="mtime" compares (mtime, size); check="hash" compares a SHA-256 of the contents
+    (useful when files are replaced with preserved timestamps, e.g. rsync -t); a file is
+    only re-hashed when its stat changed, see _file_hash.
+    """
+    paths = (pks_path, binh_path, style_path)
+    key = tuple(os.path.abspath(p) for p in paths)
+    sig = _signature(paths, check)
+
+    with _LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None and cached.signature == sig:
+            return cached
+
+        # With compiled tables every frame stays in the shared memory map and
+        # each text is decoded only when a story needs it.
+        corpus = Corpus(
+            _read_typed(pks_path, PKS_DTYPES),
+            _read_typed(binh_path, BINH_DTYPES),
+            _read_typed(style_path, STYLE_DTYPES),
+            sig,
+        )
+        corpus.quote_index = load_quote_index(pks_path, corpus.df_pks)
+        corpus.paths = paths
+        _CACHE[key] = corpus
+        print(f"📚 Loaded corpus ({len(corpus.df_pks)} sentences, {len(corpus.df_binh)} commentaries)")
+        return corpus
+
+
+def clear_corpus_cache():
+    with _LOCK:
+        _CACHE.clear()
+        _HASHES.clear()
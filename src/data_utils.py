@@ -1,44 +1,61 @@
+import numpy as np
 import pandas as pd
 from rapidfuzz import process, fuzz
+from .quote_index import QuoteIndex
+from .commentary_index import CommentaryIndex
+from .columnar import open_table, column_values, text_values, clean_column_name
+
+def read_table(path):
+    """
+    One corpus table (column names cleaned): the compiled, memory-mapped <stem>.tucol
+    (a ColumnarTable) when it is up to date (python -m src.columnar compile), otherwise
+    a DataFrame read from the CSV. Everything on the request path accepts both.
+    """
+    table = open_table(path)
+    if table is not None:
+        return table
+    df = pd.read_csv(path)
+    df.columns = [clean_column_name(c) for c in df.columns]
+    return df
 
 def load_all(pks_path, binh_path, style_path):
-    df_pks = pd.read_csv(pks_path)
-    df_binh = pd.read_csv(binh_path)
-    df_style = pd.read_csv(style_path)
-    for df in [df_pks, df_binh, df_style]:
-        df.columns = [c.strip() for c in df.columns]
-    return df_pks, df_binh, df_style
-
-def find_id_from_quote(quote, df_pks):
+    return read_table(pks_path), read_table(binh_path), read_table(style_path)
+
+SEMANTIC_SKIP_ABOVE = 90  # lexical scores at or above this are trusted without dense retrieval
+
+def find_id_from_quote(quote, df_pks, index=None, semantic=None):
     """
     Find the ID corresponding to the input sentence (can be in column C, V or M).
     Choose the best match in the 3 columns, safely handling the RapidFuzz index.
+    Pass a prebuilt QuoteIndex (see load_quote_index) to skip rebuilding the corpus
+    lists on every call.
+    Pass a SemanticIndex (see src/semantic_index.py) to re-check weak lexical
+    matches – paraphrases, translations – with dense retrieval + RapidFuzz re-rank.
     """
-    cols = [c for c in ["M", "V", "C"] if c in df_pks.columns]
-    if not cols:
-        raise ValueError("Dataset is missing all 3 columns C/V/M.")
+    if index is None:
+        index = QuoteIndex.from_dataframe(df_pks)
 
-    best_score = -1
-    best_idx = None
-    best_col = None
+    result = index.search(quote)
+    if result is None and semantic is None:
+        raise ValueError("No match found in columns C/V/M.")
+    best_idx, best_score, best_col = result if result is not None else (None, -1, None)
 
-    for col in cols:
-        corpus = df_pks[col].fillna("").astype(str).tolist()
+    if semantic is not None and best_score < SEMANTIC_SKIP_ABOVE:
+        extra = () if best_idx is None else (best_idx,)
         try:
-            result = process.extractOne(quote, corpus, scorer=fuzz.token_set_ratio)
-            if result is None:
-                continue
-            text_match, score, idx = result  # Unpack safely
-        except Exception:
-            continue
-
-        if score > best_score:
-            best_score = score
-            best_idx = idx
-            best_col = col
-
-    if best_idx is None:
-        raise ValueError("No match found in columns C/V/M.")
+            hits = semantic.search(quote, k=1, extra_rows=extra)
+        except ImportError as e:
+            print(f"⚠️ {e} Using the lexical match.")
+            hits = []
+        # The lexical winner is re-ranked too (extra_rows), so the top hit already won
+        # on the same hybrid score – never compare it with the raw lexical best_score.
+        if hits and hits[0]["row"] != best_idx:
+            hit = hits[0]
+            print(f"🧭 Semantic match (hybrid={hit['score']:.1f}, cos={hit['cosine']:.3f}, "
+                  f"lexical={hit['lexical']:.0f}) replaces lexical match (score {best_score:.1f})")
+            best_idx, best_score, best_col = hit["row"], hit["score"], hit["col"]
+        if best_idx is None:
+            raise ValueError("No match found in columns C/V/M.")
 
     best_idx = int(best_idx)
     row = df_pks.iloc[best_idx]
@@ -48,10 +65,46 @@ def find_id_from_quote(quote, df_pks):
 
     return id_value, row.to_dict()
 
-def get_binhgiai_from_id(id_value, df_binh):
+def find_ids_from_quotes(quotes, df_pks, workers=-1):
+    """
+    Batch version of find_id_from_quote for many quotes (a chapter, a syllabus...).
+    All queries are scored against the M, V and C columns in a single
+    rapidfuzz cdist call; the per-row argmax keeps the same tie-breaking as the
+    single-quote scan (column order M → V → C, then lowest row).
+    Returns (ids, scores, cols) as NumPy arrays aligned with `quotes`.
+    """
+    cols = [c for c in ["M", "V", "C"] if c in df_pks.columns]
+    if not cols:
+        raise ValueError("Dataset is missing all 3 columns C/V/M.")
+
+    quotes = [str(q) for q in quotes]
+    n_rows = len(df_pks)
+    if not quotes or n_rows == 0:
+        empty = np.array([], dtype=object)
+        return empty, np.array([], dtype=np.float32), empty.copy()
+
+    choices = []
+    for col in cols:
+        choices.extend(text_values(df_pks, col))
+
+    scores = process.cdist(quotes, choices, scorer=fuzz.token_set_ratio,
+                           dtype=np.float32, workers=workers)
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(quotes)), best]
+    row_idx = best % n_rows
+
+    id_col = "sent_id" if "sent_id" in df_pks.columns else (
+        "sect_id" if "sect_id" in df_pks.columns else "file_id")
+    ids = np.array(text_values(df_pks, id_col), dtype=object)[row_idx]
+    matched_cols = np.array(cols, dtype=object)[best // n_rows]
+    return ids, best_scores, matched_cols
+
+def get_binhgiai_from_id(id_value, df_binh, index=None):
     """
     Retrieve Commentaries by ID (sect_id) in TuThu_BinhGiai_PKS_007.csv.
     File structure: ['file_id', 'sect_id', 'E']
+    Lookup goes through a CommentaryIndex: exact id, then the id hierarchy
+    (PKS_007.002.001 → PKS_007.002), then fuzzy match as a last resort.
     """
     # Ưu tiên cột sect_id để match với id_value
     id_col = "sect_id" if "sect_id" in df_binh.columns else "ID"
@@ -60,20 +113,21 @@ def get_binhgiai_from_id(id_value, df_binh):
     if text_col is None:
         raise ValueError("Cannot found E (Bình Giải) in TuThu_BinhGiai_PKS_007.csv")
 
-    matches = df_binh[df_binh[id_col].astype(str) == str(id_value)]
+    if index is None:
+        index = CommentaryIndex.from_dataframe(df_binh, id_col=id_col)
+
+    row, tier, score = index.lookup(id_value)
+    if row is None:
+        raise ValueError(f"No E (Bình Giải) found for {id_value}.")
+    if tier == "prefix":
+        print(f"Resolved {id_value} → parent sect_id={row[id_col]}")
+    elif tier == "fuzzy":
+        print(f"⚠️ No E (Bình Giải) found for {id_value}, fuzzy match sect_id={row[id_col]} (score={score:.1f})")
 
-    if matches.empty:
-        print(f"⚠️ No E (Bình Giải) found for {id_value}, try fuzzy match by sect_id...")
-        # Fallback fuzzy
-        from rapidfuzz import process, fuzz
-        corpus = df_binh[id_col].astype(str).tolist()
-        text, score, idx = process.extractOne(str(id_value), corpus, scorer=fuzz.partial_ratio)
-        row = df_binh.iloc[int(idx)]
-        print(f"Fuzzy match sect_id={row[id_col]} (score={score:.1f})")
-    else:
-        row = matches.iloc[0]
+    return commentary_fields(row, id_col, text_col)
 
-    # Return a dict with default empty fields
+def commentary_fields(row, id_col="sect_id", text_col="E"):
+    """Commentary row → the dict get_binhgiai_from_id returns (meaning etc. left empty)."""
     return {
         "id": row.get(id_col),
         "binh_giai": row.get(text_col, ""),
@@ -83,17 +137,37 @@ def get_binhgiai_from_id(id_value, df_binh):
         "prompt_mau": ""
     }
 
+def match_style_row(id_value, df_style):
+    """Position of the first style row whose STT contains id_value, or None."""
+    for i, stt in enumerate(column_values(df_style, "STT")):
+        if stt is not None and str(id_value) in str(stt):
+            return i
+    return None
+
+def _text(value):
+    """Cell text without the whitespace/straight quotes the exported CSVs wrap it in; NaN/None → ""."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip().strip('"').strip()
+
 def build_context(id_value, df_style, df_binh_row, df_pks_row):
-    matched_style = df_style[df_style["STT"].astype(str).str.contains(id_value, na=False)]
-    if matched_style.empty:
-        matched_style = df_style.head(1)
-    style = matched_style.iloc[0].to_dict()
+    """
+    LLM context of one sentence:
+      quote      original text (C) of the PKS row
+      binh_giai  commentary (E) from get_binhgiai_from_id
+      y_nghia    the matched style row's "Ý nghĩa", else the sentence's meaning (M)
+      boi_canh, nhan_vat, prompt_mau  from the style row whose STT matches the id
+                 (the first row as the fallback style seed)
+    """
+    pos = match_style_row(id_value, df_style)
+    style = df_style.iloc[0 if pos is None else pos].to_dict()
+    meaning = _text(style.get("Ý nghĩa")) if pos is not None else ""
     return {
         "id": id_value,
-        "quote": df_pks_row.get("Nguyên văn", ""),
-        "binh_giai": df_binh_row.get("Bình giải", ""),
-        "y_nghia": df_binh_row.get("Tư tưởng chính", ""),
-        "boi_canh": style.get("Bối cảnh", ""),
-        "nhan_vat": style.get("Nhân vật", ""),
-        "prompt_mau": style.get("Prompt truyện tranh", "")
+        "quote": _text(df_pks_row.get("C")),
+        "binh_giai": _text(df_binh_row.get("binh_giai")),
+        "y_nghia": _text(df_binh_row.get("y_nghia")) or meaning or _text(df_pks_row.get("M")),
+        "boi_canh": _text(style.get("Bối cảnh")),
+        "nhan_vat": _text(style.get("Nhân vật")),
+        "prompt_mau": _text(style.get("Prompt truyện tranh"))
     }
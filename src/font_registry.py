@@ -0,0 +1,100 @@
+# Process-wide font registry and glyph-width-aware line breaking for CJK/Vietnamese captions.
+import os
+import unicodedata
+from functools import lru_cache
+from PIL import ImageFont
+
+_ADVANCES = {}  # id(font) → {char: advance in px}; fonts are cached forever so ids stay valid
+_FONT_PATHS = {}  # candidates → first existing path; misses are not stored
+
+
+def find_font_path(candidates):
+    """
+    First existing path in `candidates` (a tuple), or None. Hits are probed once per
+    process; a miss is probed again next time, so a font installed later is picked up.
+    """
+    path = _FONT_PATHS.get(candidates)
+    if path is None:
+        path = next((f for f in candidates if os.path.exists(f)), None)
+        if path is not None:
+            _FONT_PATHS[candidates] = path
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_font(font_path, size):
+    """Cached ImageFont for (path, size); default bitmap font when font_path is None."""
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default()
+
+
+def glyph_advance(font, ch):
+    """Memoized horizontal advance of one character."""
+    table = _ADVANCES.setdefault(id(font), {})
+    w = table.get(ch)
+    if w is None:
+        w = font.getlength(ch)
+        table[ch] = w
+    return w
+
+
+def text_width(text, font):
+    """Sum of glyph advances (no kerning) – close to draw.textlength, without re-shaping."""
+    return sum(glyph_advance(font, ch) for ch in text)
+
+
+def _is_wide(ch):
+    # CJK ideographs, kana, fullwidth forms and CJK punctuation may break anywhere
+    return unicodedata.east_asian_width(ch) in ("W", "F")
+
+
+def _units(text):
+    """Split into breakable units: Latin/Vietnamese words (with trailing spaces) and single wide glyphs."""
+    units, word = [], ""
+    for ch in text:
+        if _is_wide(ch):
+            if word:
+                units.append(word)
+                word = ""
+            units.append(ch)
+        elif ch.isspace():
+            word += " "
+            units.append(word)
+            word = ""
+        else:
+            word += ch
+    if word:
+        units.append(word)
+    return units
+
+
+def wrap_text(text, font, max_width):
+    """
+    Greedy line breaking by real glyph widths: breaks between words for
+    Vietnamese/Latin and between characters for CJK; an over-long word is
+    split by characters. Returns the list of lines (trailing spaces stripped).
+    """
+    text = " ".join(text.split())
+    lines, line, line_w = [], "", 0.0
+    for unit in _units(text):
+        unit_w = text_width(unit, font)
+        if line and line_w + text_width(unit.rstrip(), font) > max_width:
+            lines.append(line.rstrip())
+            line, line_w = "", 0.0
+            unit = unit.lstrip()
+            unit_w = text_width(unit, font)
+        if not line and unit_w > max_width:
+            for ch in unit:
+                ch_w = glyph_advance(font, ch)
+                if line and line_w + ch_w > max_width:
+                    lines.append(line.rstrip())
+                    line, line_w = "", 0.0
+                line += ch
+                line_w += ch_w
+            continue
+        line += unit
+        line_w += unit_w
+    if line.strip():
+        lines.append(line.rstrip())
+    return lines
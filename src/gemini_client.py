@@ -0,0 +1,105 @@
+# Process-wide Gemini client manager (one configured model per model + system prompt).
+import json
+import hashlib
+import threading
+
+_MODELS = {}
+_LOCK = threading.Lock()
+_configured_key = None
+_model_factory = None
+
+
+def _default_factory(model_name, system_instruction, api_key):
+    global _configured_key
+    import google.generativeai as genai
+    # genai keeps its transport (gRPC/REST client) module-global: configure once
+    # per API key so every GenerativeModel shares the same channel.
+    if _configured_key != api_key:
+        genai.configure(api_key=api_key)
+        _configured_key = api_key
+    return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+def set_model_factory(factory):
+    """
+    Replace how models are built: factory(model_name, system_instruction, api_key).
+    Pass None to restore the real google.generativeai client. Clears cached models.
+    """
+    global _model_factory
+    with _LOCK:
+        _model_factory = factory
+        _MODELS.clear()
+
+
+def get_model(model_name, system_instruction, api_key=None):
+    """Return the shared model for (model_name, system_instruction), building it once."""
+    key = (model_name, hashlib.sha256(system_instruction.encode("utf-8")).hexdigest())
+    model = _MODELS.get(key)
+    if model is not None:
+        return model
+    with _LOCK:
+        model = _MODELS.get(key)
+        if model is None:
+            factory = _model_factory or _default_factory
+            model = factory(model_name, system_instruction, api_key)
+            _MODELS[key] = model
+        return model
+
+
+def reset_models():
+    with _LOCK:
+        _MODELS.clear()
+
+
+# ===============================
+# LOCAL FAKE TRANSPORT (offline runs / tests)
+# ===============================
+class _Part:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Content:
+    def __init__(self, text):
+        self.parts = [_Part(text)]
+
+
+class _Candidate:
+    def __init__(self, text):
+        self.content = _Content(text)
+
+
+class FakeResponse:
+    """Mimics the shape of a google.generativeai response (candidates[0].content.parts[0].text)."""
+
+    def __init__(self, text):
+        self.candidates = [_Candidate(text)]
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Offline stand-in for genai.GenerativeModel returning a canned storyboard.
+    `instances` counts how many models were built; `calls` counts generate_content calls.
+    Use: set_model_factory(FakeGenerativeModel.factory(story_dict)).
+    """
+
+    instances = 0
+
+    def __init__(self, model_name, system_instruction, story):
+        FakeGenerativeModel.instances += 1
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.story = story
+        self.calls = 0
+
+    @classmethod
+    def factory(cls, story):
+        return lambda model_name, system_instruction, api_key: cls(model_name, system_instruction, story)
+
+    def generate_content(self, prompt, generation_config=None, stream=False, chunk_size=64):
+        self.calls += 1
+        text = json.dumps(self.story, ensure_ascii=False)
+        if stream:
+            return [FakeResponse(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+        return FakeResponse(text)
@@ -1,47 +1,50 @@
 import os
+import sys
+import time
+import threading
+import contextlib
 import torch
 from PIL import Image, ImageDraw
 from dotenv import load_dotenv
+from .model_registry import get_pipeline, unload
+from .panel_cache import get_panel_cache, panel_cache_key
+from .panel_assets import derive_panel_assets, PANEL_BOX
+from .tracing import span, set_attrs, step_callback
 
 load_dotenv()
+_hf_token_logged_in = None  # HF login is process-wide: once per token, not once per story
 
-def generate_flux_images(image_prompts):
-    """
-    Auto generate comics:
-    - FAST_MODE=true → mock image (no render)
-    - If GPU + HF token available → use FLUX.1-dev
-    - If GPU or token not available → use SDXL-base
-    - Automatically number panels if missing
-    """
-
-    os.makedirs("outputs", exist_ok=True)
+def _derive_assets(out_path):
+    """Resize-once stage: layout-size image + web thumbnail next to the panel."""
+    try:
+        derive_panel_assets(out_path, PANEL_BOX)
+    except Exception as e:
+        print(f"⚠️ Could not derive assets for {out_path}: {e}")
 
-    # FAST MODE: mock preview
-    if os.getenv("FAST_MODE", "false").lower() == "true":
-        print("⚡ FAST_MODE: Generating mock panels (no diffusion).")
-        for i, p in enumerate(image_prompts, start=1):
-            panel = p.get("panel") or f"{i:02d}"
-            img = Image.new("RGB", (768, 512), "white")
-            d = ImageDraw.Draw(img)
-            d.text((30, 30), f"Panel {panel}", fill="black")
-            prompt = p.get("prompt", "")[:220]
-            if len(prompt) > 350:
-                prompt = prompt[:350]
-            d.text((30, 80), prompt, fill="gray")
-            out_path = f"outputs/panel_{panel}_mock.png"
-            img.save(out_path)
-        print("Mock images saved.")
-        return
+def render_mock_panel(p, i, output_dir="outputs"):
+    """FAST_MODE placeholder panel for image_prompts[i-1]."""
+    panel = p.get("panel") or f"{i:02d}"
+    img = Image.new("RGB", (768, 512), "white")
+    d = ImageDraw.Draw(img)
+    d.text((30, 30), f"Panel {panel}", fill="black")
+    prompt = p.get("prompt", "")[:220]
+    if len(prompt) > 350:
+        prompt = prompt[:350]
+    d.text((30, 80), prompt, fill="gray")
+    out_path = os.path.join(output_dir, f"panel_{panel}_mock.png")
+    img.save(out_path)
+    _derive_assets(out_path)
+    return out_path
 
+def select_model():
+    """Pick (device, model_id) for this machine – GPU/MPS priority, FLUX.1-dev only with GPU + HF token."""
+    global _hf_token_logged_in
     # Identify device (GPU / MPS priority)
     device = "cuda" if torch.cuda.is_available() else (
         "mps" if torch.backends.mps.is_available() else "cpu"
     )
     print(f"Using device: {device}")
 
-    from diffusers import DiffusionPipeline
-    from huggingface_hub import login
-
     hf_token = os.getenv("HUGGINGFACE_TOKEN", "").strip()
     model_id = None
 
@@ -53,16 +56,64 @@ def generate_flux_images(image_prompts):
         model_id = "stabilityai/stable-diffusion-xl-base-1.0"
         print("Using lightweight model:", model_id)
     else:
+        from huggingface_hub import login
         try:
-            login(token=hf_token)
+            if _hf_token_logged_in != hf_token:
+                login(token=hf_token)
+                _hf_token_logged_in = hf_token
             model_id = "black-forest-labs/FLUX.1-dev"
             print("🎨 Using high-quality model:", model_id)
         except Exception as e:
             print("⚠️ Hugging Face login failed, falling back to SDXL:", e)
             model_id = "stabilityai/stable-diffusion-xl-base-1.0"
+    return device, model_id
+
+# ===============================
+# INFERENCE PROFILES
+# ===============================
+# DIFFUSION_PROFILE selects one per deployment:
+# - quality:    float32 everywhere (previous behaviour)
+# - balanced:   fp16 weights on CUDA / bf16 autocast on CPU, VAE slicing, channels_last UNet
+# - low_memory: balanced + VAE tiling and sequential CPU offload (CUDA)
+# DIFFUSION_COMPILE=true additionally wraps the UNet in torch.compile.
+INFERENCE_PROFILES = {
+    "quality": {
+        "cuda_dtype": "float32", "cpu_autocast_bf16": False,
+        "attention_slicing": True, "vae_slicing": False, "vae_tiling": False,
+        "cpu_offload": False, "channels_last": False,
+    },
+    "balanced": {
+        "cuda_dtype": "float16", "cpu_autocast_bf16": True,
+        "attention_slicing": True, "vae_slicing": True, "vae_tiling": False,
+        "cpu_offload": False, "channels_last": True,
+    },
+    "low_memory": {
+        "cuda_dtype": "float16", "cpu_autocast_bf16": True,
+        "attention_slicing": True, "vae_slicing": True, "vae_tiling": True,
+        "cpu_offload": True, "channels_last": False,
+    },
+}
+DEFAULT_PROFILE = os.getenv("DIFFUSION_PROFILE", "quality")
+
+def get_profile(name=None):
+    name = name or DEFAULT_PROFILE
+    if name not in INFERENCE_PROFILES:
+        raise ValueError(f"Unknown inference profile '{name}' (choose from {', '.join(INFERENCE_PROFILES)})")
+    return name, INFERENCE_PROFILES[name]
+
+def _profile_dtype(profile, device):
+    # MPS stays float32 (Half overflow); CPU keeps float32 weights and uses bf16 autocast instead.
+    if device == "cuda":
+        return getattr(torch, profile["cuda_dtype"])
+    return torch.float32
+
+def _load_pipeline(model_id, device, dtype, profile_name="quality"):
+    """Load weights from disk/hub – only called by the model registry on a miss."""
+    from diffusers import DiffusionPipeline
+    _, profile = get_profile(profile_name)
 
     # Load model (optimized for Mac)
-    print("Loading diffusion pipeline…")
+    print(f"Loading diffusion pipeline… (profile={profile_name})")
     # pipe = DiffusionPipeline.from_pretrained(
     #     model_id,
     #     # torch_dtype=torch.float16 if device != "cpu" else torch.float32,
@@ -72,8 +123,12 @@ def generate_flux_images(image_prompts):
     # ).to(device)
     pipe = DiffusionPipeline.from_pretrained(
         model_id,
-        torch_dtype=torch.float32,).to(device)
-    
+        torch_dtype=dtype,)
+    if profile["cpu_offload"] and device == "cuda":
+        pipe.enable_sequential_cpu_offload()  # moves modules to the GPU only while they run
+    else:
+        pipe = pipe.to(device)
+
     # if device == "mps":
     #     pipe.enable_attention_slicing()
     #     torch.set_default_dtype(torch.float16)
@@ -82,33 +137,407 @@ def generate_flux_images(image_prompts):
         pipe.to(torch.float32)
         pipe.unet.to(torch.float32)
         pipe.text_encoder.to(torch.float32)
+        print("Fixed: forced all modules to float32 for MPS (prevent Half overflow).")
     if hasattr(pipe, "vae"):
-        pipe.vae.to(torch.float32)
+        if dtype == torch.float32:
+            pipe.vae.to(torch.float32)
+        if profile["vae_slicing"]:
+            pipe.enable_vae_slicing()
+        if profile["vae_tiling"]:
+            pipe.enable_vae_tiling()
+    if profile["attention_slicing"]:
         pipe.enable_attention_slicing()
-        print("Fixed: forced all modules to float32 for MPS (prevent Half overflow).")
+    if hasattr(pipe, "unet"):
+        if profile["channels_last"]:
+            pipe.unet.to(memory_format=torch.channels_last)
+        if _compile_enabled():
+            pipe.unet = torch.compile(pipe.unet, mode="reduce-overhead")
+            print("UNet wrapped in torch.compile")
+
+    pipe._inference_profile = profile_name
+    pipe._autocast_bf16 = profile["cpu_autocast_bf16"] and device == "cpu"
+    return pipe
+
+def _compile_enabled():
+    return os.getenv("DIFFUSION_COMPILE", "false").lower() == "true"
+
+def load_diffusion_pipeline(profile=None, device=None, model_id=None):
+    """
+    Select device + model (unless given) and fetch the pipeline from the process-level
+    registry, so weights are read from disk once per process instead of once per story.
+    Returns (pipe, model_id).
+    """
+    profile_name, profile_cfg = get_profile(profile)
+    if device is None or model_id is None:
+        device, model_id = select_model()
+    dtype = _profile_dtype(profile_cfg, device)
+    pipe = get_pipeline(
+        model_id, device, dtype,
+        loader=lambda m, d, t: _load_pipeline(m, d, t, profile_name),
+        # a compiled UNet is a different pipeline: never share its registry entry
+        variant=f"{profile_name}+compile" if _compile_enabled() else profile_name,
+    )
+    return pipe, model_id
+
+def warmup(profile=None):
+    """Load the default pipeline ahead of the first request (e.g. at server start)."""
+    return load_diffusion_pipeline(profile)
+
+def _inference_context(pipe):
+    """bf16 autocast on CPU for the balanced/low_memory profiles, no-op otherwise."""
+    if getattr(pipe, "_autocast_bf16", False):
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+def _current_rss_bytes():
+    """Resident set size right now (Linux /proc), or None elsewhere."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KB on Linux
+
+class PeakMemory:
+    """
+    Peak memory of one generate_flux_images call, so profiles run in the same
+    process can be compared (ru_maxrss only ever grows):
+    - cuda: torch.cuda.max_memory_allocated after reset_peak_memory_stats
+    - cpu / mps: RSS sampled every `interval` seconds from /proc/self/statm,
+      falling back to the growth of ru_maxrss (a lower bound) where /proc is missing.
+    peak_mb is the highest value seen during the call, growth_mb its increase over the start.
+    """
+
+    def __init__(self, device, interval=0.05):
+        self.device = device
+        self.interval = interval
+        self.source = None
+        self.peak_mb = None
+        self.growth_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = _current_rss_bytes()
+            if rss is not None:
+                self._peak = max(self._peak, rss)
+
+    def __enter__(self):
+        if self.device == "cuda":
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            self.source, self._start = "cuda_allocated", torch.cuda.memory_allocated()
+        elif _current_rss_bytes() is not None:
+            self.source, self._start = "rss_sampled", _current_rss_bytes()
+            self._peak = self._start
+            self._thread = threading.Thread(target=self._sample, name="peak-memory", daemon=True)
+            self._thread.start()
+        else:
+            self.source, self._start = "max_rss_growth", _max_rss_bytes()
+        return self
 
-    # Generate images for each panel
-    for i, p in enumerate(image_prompts, start=1):
-        panel_id = p.get("panel") or f"{i:02d}"
-        prompt = p.get("prompt", "")
-        print(f"Generating panel {panel_id} with model {model_id}…")
+    def __exit__(self, exc_type, exc, tb):
+        if self.source == "cuda_allocated":
+            torch.cuda.synchronize()
+            peak = torch.cuda.max_memory_allocated()
+        elif self.source == "rss_sampled":
+            self._stop.set()
+            self._thread.join()
+            peak = max(self._peak, _current_rss_bytes() or 0)
+        else:
+            peak = _max_rss_bytes()
+        if peak is not None and self._start is not None:
+            self.peak_mb = peak / (1024 * 1024)
+            self.growth_mb = (peak - self._start) / (1024 * 1024)
+        return False
 
+def _sampler_kwargs(model_id):
+    return {
+        "num_inference_steps": 20 if "stabilityai" in model_id else 25,
+        "guidance_scale": 3.5,
+    }
+
+def _panel_generator(pipe, p):
+    """torch.Generator seeded from image_prompt["seed"], or None when the panel has no seed."""
+    seed = p.get("seed")
+    if seed is None:
+        return None
+    device = str(getattr(pipe, "device", "cpu"))
+    return torch.Generator(device=device).manual_seed(int(seed))
+
+def _save_error_panel(panel_id, output_dir):
+    img = Image.new("RGB", (768, 512), "white")
+    d = ImageDraw.Draw(img)
+    d.text((20, 20), f"Panel {panel_id}", fill="black")
+    d.text((20, 60), "Render failed", fill="red")
+    out_path = os.path.join(output_dir, f"panel_{panel_id}_error.png")
+    img.save(out_path)
+    _derive_assets(out_path)
+    return out_path
+
+def panel_key(model_id, p, profile_name):
+    """Panel cache key for image_prompt p rendered with model_id and the sampler settings below."""
+    sampler = _sampler_kwargs(model_id)
+    return panel_cache_key(
+        p.get("prompt", ""), model_id,
+        sampler["num_inference_steps"], sampler["guidance_scale"],
+        seed=p.get("seed"), width=p.get("width"), height=p.get("height"),
+        profile=profile_name,
+    )
+
+def render_panel(pipe, model_id, p, i, output_dir="outputs", cache=None, cache_key=None):
+    """
+    Render image_prompts[i-1] with a loaded pipeline; writes an _error.png placeholder on failure.
+    Successful renders are added to `cache` under `cache_key` when given.
+    """
+    panel_id = p.get("panel") or f"{i:02d}"
+    prompt = p.get("prompt", "")
+    print(f"Generating panel {panel_id} with model {model_id}…")
+
+    try:
+        kwargs = _sampler_kwargs(model_id)
+        generator = _panel_generator(pipe, p)
+        if generator is not None:
+            kwargs["generator"] = generator
+        with span("diffusion", panels=1), _inference_context(pipe):
+            on_step = step_callback()
+            if on_step is not None:
+                kwargs["callback_on_step_end"] = on_step
+            image = pipe(prompt, **kwargs).images[0]
+        out_path = os.path.join(output_dir, f"panel_{panel_id}.png")
+        image.save(out_path)
+        print(f"Saved {out_path}")
+        _derive_assets(out_path)
+    except Exception as e:
+        print(f"Error rendering panel {panel_id}: {e}")
+        # fallback → mock preview if render fails
+        return _save_error_panel(panel_id, output_dir)
+    if cache is not None and cache_key:
+        cache.store(cache_key, out_path)
+    return out_path
+
+# ===============================
+# BATCHED INFERENCE
+# ===============================
+MAX_AUTO_BATCH = int(os.getenv("DIFFUSION_MAX_BATCH", "4"))
+# Rough activation memory per image in one forward pass (fp32, default resolution)
+BYTES_PER_IMAGE = {"black-forest-labs/FLUX.1-dev": 6 << 30}
+DEFAULT_BYTES_PER_IMAGE = 3 << 30
+_oom_batch_cap = None  # lowered after an OOM so later batches start smaller
+PANEL_CACHE_ENABLED = os.getenv("PANEL_CACHE", "true").lower() == "true"
+
+def _is_oom(e):
+    oom_type = getattr(getattr(torch, "cuda", None), "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(e, oom_type):
+        return True
+    return isinstance(e, (MemoryError, RuntimeError)) and "out of memory" in str(e).lower()
+
+def _available_memory(device):
+    try:
+        if device == "cuda":
+            free, _ = torch.cuda.mem_get_info()
+            return free
+        if hasattr(os, "sysconf"):
+            return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, RuntimeError, AttributeError):
+        pass
+    return None
+
+def auto_batch_size(device, model_id):
+    """Largest batch that fits the free memory estimate, capped by DIFFUSION_MAX_BATCH and past OOMs."""
+    if device == "mps":
+        return 1  # unified memory: batching mostly trades latency for swap
+    free = _available_memory(device)
+    per_image = BYTES_PER_IMAGE.get(model_id, DEFAULT_BYTES_PER_IMAGE)
+    size = max(1, min(MAX_AUTO_BATCH, free // per_image)) if free else 1
+    if _oom_batch_cap is not None:
+        size = min(size, _oom_batch_cap)
+    return int(size)
+
+def render_panel_batch(pipe, model_id, batch, output_dir="outputs", cache=None, cache_keys=None):
+    """
+    Render several (i, image_prompt) pairs in one pipeline call (prompt list).
+    Output names and per-panel seeds are the same as render_panel. On OOM the
+    batch is split in half and retried, and later batches (fixed or auto size)
+    are split to that cap up front; any other failure falls back to
+    rendering the panels one by one (keeping the per-panel _error.png fallback).
+    `cache_keys` (aligned with batch) store successful renders in `cache`.
+    """
+    global _oom_batch_cap
+    cache_keys = cache_keys or [None] * len(batch)
+    if len(batch) == 1:
+        i, p = batch[0]
+        return [render_panel(pipe, model_id, p, i, output_dir, cache, cache_keys[0])]
+    if _oom_batch_cap is not None and len(batch) > _oom_batch_cap:
+        # A past OOM lowered the cap: split up front instead of OOM-ing on every batch again
+        cap = _oom_batch_cap
+        return [path for start in range(0, len(batch), cap)
+                for path in render_panel_batch(pipe, model_id, batch[start:start + cap], output_dir,
+                                               cache, cache_keys[start:start + cap])]
+
+    panel_ids = [p.get("panel") or f"{i:02d}" for i, p in batch]
+    print(f"Generating panels {', '.join(panel_ids)} in one batch with model {model_id}…")
+    try:
+        kwargs = _sampler_kwargs(model_id)
+        generators = [_panel_generator(pipe, p) for _, p in batch]
+        if any(g is not None for g in generators):
+            kwargs["generator"] = [
+                g if g is not None else torch.Generator(device=str(getattr(pipe, "device", "cpu"))).manual_seed(torch.Generator().seed())
+                for g in generators
+            ]
+        with span("diffusion", panels=len(batch)), _inference_context(pipe):
+            on_step = step_callback()
+            if on_step is not None:
+                kwargs["callback_on_step_end"] = on_step
+            images = pipe(
+                [p.get("prompt", "") for _, p in batch],
+                num_images_per_prompt=1,
+                **kwargs
+            ).images
+    except Exception as e:
+        if _is_oom(e):
+            half = len(batch) // 2
+            _oom_batch_cap = max(1, half)
+            print(f"⚠️ OOM at batch size {len(batch)} – retrying with {half}")
+            from .model_registry import _free_memory
+            _free_memory()
+            return (render_panel_batch(pipe, model_id, batch[:half], output_dir, cache, cache_keys[:half])
+                    + render_panel_batch(pipe, model_id, batch[half:], output_dir, cache, cache_keys[half:]))
+        print(f"Batch render failed ({e}) – rendering panels individually")
+        return [render_panel(pipe, model_id, p, i, output_dir, cache, key)
+                for (i, p), key in zip(batch, cache_keys)]
+
+    out_paths = []
+    for panel_id, image, key in zip(panel_ids, images, cache_keys):
+        out_path = os.path.join(output_dir, f"panel_{panel_id}.png")
         try:
-            image = pipe(
-                prompt,
-                num_inference_steps=20 if "stabilityai" in model_id else 25,
-                guidance_scale=3.5
-            ).images[0]
-            out_path = f"outputs/panel_{panel_id}.png"
             image.save(out_path)
             print(f"Saved {out_path}")
+            _derive_assets(out_path)
+            if cache is not None and key:
+                cache.store(key, out_path)
         except Exception as e:
             print(f"Error rendering panel {panel_id}: {e}")
-            # fallback → mock preview if render fails
-            img = Image.new("RGB", (768, 512), "white")
-            d = ImageDraw.Draw(img)
-            d.text((20, 20), f"Panel {panel_id}", fill="black")
-            d.text((20, 60), "Render failed", fill="red")
-            img.save(f"outputs/panel_{panel_id}_error.png")
-
-    print("All panels generated successfully.")
\ No newline at end of file
+            out_path = _save_error_panel(panel_id, output_dir)
+        out_paths.append(out_path)
+    return out_paths
+
+def _iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def generate_flux_images(image_prompts, output_dir="outputs", batch_size=None, profile=None):
+    """
+    Auto generate comics:
+    - FAST_MODE=true → mock image (no render)
+    - If GPU + HF token available → use FLUX.1-dev
+    - If GPU or token not available → use SDXL-base
+    - Automatically number panels if missing
+    `image_prompts` may be any iterable – including a generator fed by the
+    streaming storyboard parser – and each panel is rendered as soon as it arrives.
+    batch_size (or DIFFUSION_BATCH_SIZE): 1 = one panel per call (default),
+    N = up to N panels per pipeline call, "auto" = sized from free memory.
+    profile (or DIFFUSION_PROFILE): quality / balanced / low_memory, see INFERENCE_PROFILES.
+    Panels already in the panel cache (same prompt, model, sampler settings, seed,
+    resolution and profile) are copied instead of re-rendered; PANEL_CACHE=false disables it.
+    Returns {"profile", "panels", "seconds", "seconds_per_panel", "peak_memory_mb",
+    "peak_memory_growth_mb", "peak_memory_source", "cache_hits", "cache_misses"} –
+    "panels" counts rendered panels; memory is measured for this call only, see
+    PeakMemory. In FAST_MODE nothing is rendered: "panels", "profile" and the
+    timing/memory values are None and both cache counts are 0.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # FAST MODE: mock preview
+    if os.getenv("FAST_MODE", "false").lower() == "true":
+        print("⚡ FAST_MODE: Generating mock panels (no diffusion).")
+        for i, p in enumerate(image_prompts, start=1):
+            render_mock_panel(p, i, output_dir)
+        print("Mock images saved.")
+        return {
+            "profile": None,
+            "panels": None,
+            "seconds": None,
+            "seconds_per_panel": None,
+            "peak_memory_mb": None,
+            "peak_memory_growth_mb": None,
+            "peak_memory_source": None,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
+
+    profile_name, _ = get_profile(profile)
+    device, model_id = select_model()
+    cache = get_panel_cache() if PANEL_CACHE_ENABLED else None
+    counts = {"hits": 0, "misses": 0}
+
+    def pending():
+        """Serve cache hits straight to output_dir; yield only panels that need diffusion."""
+        for i, p in enumerate(image_prompts, start=1):
+            key = panel_key(model_id, p, profile_name)
+            panel_id = p.get("panel") or f"{i:02d}"
+            if cache is not None:
+                out_path = os.path.join(output_dir, f"panel_{panel_id}.png")
+                if cache.fetch(key, out_path):
+                    _derive_assets(out_path)
+                    counts["hits"] += 1
+                    print(f"💾 Panel {panel_id} served from cache ({key[:12]})")
+                    continue
+                counts["misses"] += 1
+            yield i, p, key
+
+    if batch_size is None:
+        batch_size = os.getenv("DIFFUSION_BATCH_SIZE", "1")
+    if str(batch_size).lower() == "auto":
+        batch_size = auto_batch_size(device, model_id)
+        print(f"Auto batch size: {batch_size}")
+    batch_size = max(1, int(batch_size))
+
+    # Generate images for each panel; the pipeline is only loaded on the first cache miss
+    pipe = None
+    n_panels = 0
+    t0 = time.perf_counter()
+    with PeakMemory(device) as memory:
+        for batch in _iter_batches(pending(), batch_size):
+            if pipe is None:
+                with span("load_diffusion_pipeline", profile=profile_name):
+                    pipe, model_id = load_diffusion_pipeline(profile_name, device, model_id)
+            render_panel_batch(pipe, model_id, [(i, p) for i, p, _ in batch], output_dir,
+                               cache, [key for _, _, key in batch])
+            n_panels += len(batch)
+    elapsed = time.perf_counter() - t0
+
+    stats = {
+        "profile": profile_name,
+        "panels": n_panels,
+        "seconds": elapsed,
+        "seconds_per_panel": elapsed / n_panels if n_panels else 0.0,
+        "peak_memory_mb": memory.peak_mb,
+        "peak_memory_growth_mb": memory.growth_mb,
+        "peak_memory_source": memory.source,
+        "cache_hits": counts["hits"],
+        "cache_misses": counts["misses"],
+    }
+    set_attrs(rendered=n_panels, cache_hits=counts["hits"], profile=profile_name)
+    peak = (f"{memory.peak_mb:.0f} MB (+{memory.growth_mb:.0f} MB, {memory.source})"
+            if memory.peak_mb is not None else "n/a")
+    print(f"📊 profile={profile_name} | peak memory {peak} | {stats['seconds_per_panel']:.2f}s/panel ({n_panels} panels)")
+    if cache is not None:
+        print(f"💾 Panel cache: {counts['hits']} hits, {counts['misses']} misses")
+    print("All panels generated successfully.")
+    return stats
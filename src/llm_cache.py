@@ -0,0 +1,132 @@
+# Content-addressed, disk-backed cache for Gemini responses (SQLite).
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite")
+DEFAULT_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024)
+DEFAULT_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def cache_key(model_name, system_prompt, user_prompt, generation_config=None, context_id=None):
+    """
+    SHA-256 over everything that determines the model output, plus the id of the
+    sentence the prompt was built for: two sentences never share an entry, even
+    when their prompts happen to render identically.
+    """
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "system": system_prompt,
+            "user": user_prompt,
+            "config": generation_config or {},
+            "id": context_id,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite store of response text keyed by cache_key().
+    - TTL: entries older than ttl_seconds are treated as misses and deleted
+    - LRU: when the total stored size exceeds max_bytes, least recently
+      accessed entries are evicted first
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   value TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   created REAL NOT NULL,
+                   accessed REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def contains(self, key):
+        """True when get(key) would hit; unlike get() it touches neither LRU order nor hit stats."""
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        return not (self.ttl_seconds and time.time() - row[0] > self.ttl_seconds)
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide cache instance at DEFAULT_CACHE_PATH."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
@@ -0,0 +1,233 @@
+# Background story-log writer: the pipeline enqueues records, one thread batches them into the StoryLog.
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+
+from .story_log import get_story_log, DEFAULT_LOG_PATH
+
+POLICIES = ("block", "drop", "spill")
+DEFAULT_QUEUE_SIZE = int(os.getenv("STORY_LOG_QUEUE_SIZE", "1000"))
+DEFAULT_POLICY = os.getenv("STORY_LOG_FULL_POLICY", "block").lower()
+DEFAULT_BATCH_SIZE = int(os.getenv("STORY_LOG_BATCH", "100"))
+DEFAULT_FLUSH_SECONDS = float(os.getenv("STORY_LOG_FLUSH_SECONDS", "1.0"))
+
+_STOP = object()
+_FLUSH_POLL_SECONDS = 0.5  # how often a waiting flush() checks that the writer thread is alive
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BackgroundLogWriter:
+    """
+    Bounded queue + writer thread. Records are (story_id, quote, title, story, ts)
+    tuples, written with StoryLog.append_many in batches of up to batch_size or
+    every flush_seconds, whichever comes first.
+
+    When the queue is full:
+      block – the caller waits for room (nothing is lost)
+      drop  – the record is discarded and counted in `dropped`
+      spill – the record is appended to <log>.spill.jsonl and replayed by the
+              writer once the queue has drained (also on the next start)
+    """
+
+    def __init__(self, log_path=DEFAULT_LOG_PATH, max_queue=DEFAULT_QUEUE_SIZE, policy=DEFAULT_POLICY,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown log queue policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.log = get_story_log(log_path)
+        self.policy = policy
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.spill_path = self.log.path + ".spill.jsonl"
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="story-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, story_id, quote, title, story=None):
+        """Enqueue one log record; returns False if it was dropped."""
+        if self._closed:
+            raise RuntimeError("log writer is closed")
+        record = (story_id, quote, title, story, time.time())
+        if self.policy == "block":
+            self._queue.put(record)
+            return True
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+        if self.policy == "drop":
+            self.dropped += 1
+            return False
+        self._spill(record)
+        return True
+
+    @staticmethod
+    def _spill_line(record):
+        story_id, quote, title, story, ts = record
+        return json.dumps({"story_id": story_id, "quote": quote, "title": title, "story": story, "ts": ts},
+                          ensure_ascii=False) + "\n"
+
+    def _spill(self, record):
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(self._spill_line(record))
+            self.spilled += 1
+
+    def _replay_spill(self):
+        """
+        Move spilled records into the log (called from the writer thread). New spill
+        lines are appended to a .replay file left by an earlier attempt or crash rather
+        than replacing it; records that fail to write stay in .replay for the next try.
+        """
+        claimed = self.spill_path + ".replay"
+        with self._spill_lock:
+            if os.path.exists(self.spill_path):
+                if os.path.exists(claimed):
+                    with open(self.spill_path, "r", encoding="utf-8") as src, \
+                            open(claimed, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, claimed)
+        if not os.path.exists(claimed):
+            return
+        entries = []
+        with open(claimed, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    r = json.loads(line)
+                    entries.append((r["story_id"], r["quote"], r["title"], r["story"], r["ts"]))
+        failed = self._write(entries)
+        if not failed:
+            os.remove(claimed)
+            return
+        tmp = claimed + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(self._spill_line(record) for record in failed)
+        os.replace(tmp, claimed)
+
+    def _write(self, batch):
+        """Append batch in chunks of batch_size; returns the records that could not be written."""
+        failed = []
+        for i in range(0, len(batch), self.batch_size):
+            chunk = batch[i:i + self.batch_size]
+            try:
+                self.log.append_many(chunk)
+                self.written += len(chunk)
+            except Exception as e:
+                self.errors += len(chunk)
+                failed.extend(chunk)
+                print(f"⚠️ Story log write failed ({len(chunk)} records): {e}")
+        return failed
+
+    def _run(self):
+        try:
+            self._replay_spill()  # leftovers from a previous run
+        except Exception as e:
+            print(f"⚠️ Story log spill replay failed: {e}")
+        stop = False
+        while not stop:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                item = None
+            deadline = time.monotonic() + self.flush_seconds
+            markers = []
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushMarker):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+            if batch:
+                self._write(batch)
+            if stop or markers or self._queue.empty():
+                try:
+                    self._replay_spill()
+                except Exception as e:
+                    print(f"⚠️ Story log spill replay failed: {e}")
+            for m in markers:
+                m.done.set()
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything enqueued so far has been written. Returns False on
+        timeout, or right away when the writer thread is not running (closed or died).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        marker = _FlushMarker()  # travels through the queue behind all earlier records
+        while True:
+            if not self._thread.is_alive():
+                return False
+            try:
+                self._queue.put(marker, timeout=_FLUSH_POLL_SECONDS)
+                break
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+        while not marker.done.wait(_FLUSH_POLL_SECONDS):
+            if not self._thread.is_alive():
+                return marker.done.is_set()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        return True
+
+    def close(self, timeout=30):
+        """Write all pending records (including spilled ones) and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(log_path=DEFAULT_LOG_PATH):
+    """Process-wide writer per log file; flushed and stopped at interpreter exit."""
+    key = os.path.abspath(log_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer._closed:
+            writer = _writers[key] = BackgroundLogWriter(log_path)
+        return writer
+
+
+def flush_all(timeout=None):
+    with _writers_lock:
+        writers = list(_writers.values())
+    for w in writers:
+        if not w._closed:
+            w.flush(timeout)
+
+
+@atexit.register
+def close_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+    for w in writers:
+        w.close()
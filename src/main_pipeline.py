@@ -1,11 +1,17 @@
-import os, json
-import google.generativeai as genai
+import os, json, queue, threading, contextvars
 from dotenv import load_dotenv
-from .data_utils import load_all, find_id_from_quote, get_binhgiai_from_id, build_context
+from .data_utils import find_id_from_quote, get_binhgiai_from_id, build_context
+from .corpus_store import get_corpus
+from .quote_index import source_signature
 from .gemini_rules_full import get_system_prompt, build_user_prompt
+from .llm_cache import cache_key, get_llm_cache
+from .gemini_client import get_model
+from .storyboard_stream import ImagePromptStreamParser
 from .generate_flux_images import generate_flux_images
-from .render_story_page import render_story_page
+from .render_story_page import render_story_page, setup_logging
 from src.log_prompt_history import append_story_log
+from .tracing import span, set_attrs
+from .pregenerated import get_pregenerated_store
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -15,41 +21,221 @@ DATA_PKS = "data/TuThu_PKS_007.csv"
 DATA_BINH = "data/TuThu_BinhGiai_PKS_007.csv"
 DATA_STYLE = "data/TuThu_Data_Example.csv"
 
-def call_gemini(context):
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel(MODEL_TEXT, system_instruction=get_system_prompt())
+_STREAM_DONE = object()
+
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "true").lower() == "true"
+QUOTE_MATCH = os.getenv("QUOTE_MATCH", "lexical").lower()  # lexical | hybrid (+ dense retrieval)
+PREGENERATED_ENABLED = os.getenv("PREGENERATED", "true").lower() == "true"
+
+def storyboard_cache_key(context, system_prompt=None, user_prompt=None):
+    """LLM cache key of the storyboard for this context (see llm_cache.cache_key)."""
+    return cache_key(MODEL_TEXT, system_prompt or get_system_prompt(),
+                     user_prompt or build_user_prompt(context), GENERATION_CONFIG,
+                     context_id=context.get("id"))
+
+def call_gemini(context, use_cache=LLM_CACHE_ENABLED, refresh=False):
+    """
+    Generate the storyboard JSON for a context.
+    Responses are cached by hash(model, system prompt, user prompt, generation config, sentence id):
+    use_cache=False bypasses the cache, refresh=True ignores a cached entry and overwrites it.
+    """
+    system_prompt = get_system_prompt()
+    user_prompt = build_user_prompt(context)
+    key = storyboard_cache_key(context, system_prompt, user_prompt)
+
+    if use_cache and not refresh:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            print(f"💾 LLM cache hit ({key[:12]})")
+            set_attrs(llm_cache_hit=True)
+            return json.loads(cached)
+
+    model = get_model(MODEL_TEXT, system_prompt, api_key=GOOGLE_API_KEY)
+    resp = model.generate_content(
+        user_prompt,
+        generation_config=GENERATION_CONFIG
+    )
+    text = resp.candidates[0].content.parts[0].text
+    data = json.loads(text)
+    if use_cache:
+        get_llm_cache().put(key, text)
+    return data
+
+def call_gemini_stream(context, on_prompt, use_cache=LLM_CACHE_ENABLED, refresh=False):
+    """
+    Streaming variant of call_gemini: each image_prompts[i] is passed to
+    on_prompt(prompt) as soon as its JSON object is complete, while Gemini is
+    still writing the rest of the storyboard. Returns the full storyboard.
+    A cache hit replays every prompt immediately.
+    """
+    system_prompt = get_system_prompt()
+    user_prompt = build_user_prompt(context)
+    key = storyboard_cache_key(context, system_prompt, user_prompt)
+
+    if use_cache and not refresh:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            print(f"💾 LLM cache hit ({key[:12]})")
+            set_attrs(llm_cache_hit=True)
+            data = json.loads(cached)
+            for p in data.get("image_prompts", []):
+                on_prompt(p)
+            return data
+
+    model = get_model(MODEL_TEXT, system_prompt, api_key=GOOGLE_API_KEY)
     resp = model.generate_content(
-        build_user_prompt(context),
-        generation_config={"response_mime_type": "application/json"}
+        user_prompt,
+        generation_config=GENERATION_CONFIG,
+        stream=True
     )
-    data = json.loads(resp.candidates[0].content.parts[0].text)
+    parser = ImagePromptStreamParser()
+    n_prompts = 0
+    for chunk in resp:
+        for p in parser.feed(chunk.text):
+            n_prompts += 1
+            print(f"📨 Streamed image prompt {n_prompts}")
+            on_prompt(p)
+    text = parser.text()
+    data = json.loads(text)
+    if use_cache:
+        get_llm_cache().put(key, text)
     return data
 
-def run_pipeline(quote):
-    df_pks, df_binh, df_style = load_all(DATA_PKS, DATA_BINH, DATA_STYLE)
-    id_value, row_pks = find_id_from_quote(quote, df_pks)
-    row_binh = get_binhgiai_from_id(id_value, df_binh)
-    context = build_context(id_value, df_style, row_binh, row_pks)
-    print(f"📘 Building story for ID {id_value} – {context['quote'][:40]}...")
-    story = call_gemini(context)
-    os.makedirs("outputs", exist_ok=True)
-    with open("outputs/storyboard.json", "w", encoding="utf-8") as f:
-        json.dump(story, f, ensure_ascii=False, indent=2)
-    print("Saved outputs/storyboard.json")
-    # Log information
-    story_id = id_value
-    story_title = story.get("story_title", "Untitled Story")
-    # append_story_log(context["quote"], story_id, story_title)
-    append_story_log(
-        quote=context["quote"],
-        story_id=id_value,
-        story_title=story.get("story_title", "Untitled Story"),
-        storyboard_path="outputs/storyboard.json"
-        )
-
-    if "image_prompts" in story:
-        generate_flux_images(story["image_prompts"])
-        render_story_page("outputs/storyboard.json", "outputs", output_pdf=True)  
+def _stream_story_and_panels(context, output_dir="outputs"):
+    """
+    Run the LLM stream in a producer thread and render panels as prompts arrive,
+    so diffusion of panel 1 overlaps with Gemini still writing the later panels.
+    """
+    prompts = queue.Queue()
+    result = {}
+
+    def produce():
+        try:
+            with span("call_gemini", stream=True):
+                result["story"] = call_gemini_stream(context, prompts.put)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            prompts.put(_STREAM_DONE)
+
+    def consume():
+        while True:
+            p = prompts.get()
+            if p is _STREAM_DONE:
+                return
+            yield p
+
+    # copy_context so the producer's spans nest under the current trace
+    producer = threading.Thread(target=contextvars.copy_context().run, args=(produce,),
+                                name="gemini-stream", daemon=True)
+    producer.start()
+    with span("generate_flux_images", stream=True):
+        generate_flux_images(consume(), output_dir=output_dir)
+    producer.join()
+    if "error" in result:
+        raise result["error"]
+    return result["story"]
+
+def context_for_id(corpus, id_value, row_pks):
+    """The LLM context of one sentence: a precompiled bundle when available, built otherwise."""
+    bundles = corpus.context_bundles
+    if bundles is not None and id_value in bundles:
+        return dict(bundles[id_value])
+    _, df_binh, df_style = corpus.frames()
+    with span("get_binhgiai_from_id"):
+        row_binh = get_binhgiai_from_id(id_value, df_binh, index=corpus.commentary_index)
+    with span("build_context"):
+        return build_context(id_value, df_style, row_binh, row_pks)
+
+def prepare_context(quote):
+    """
+    Resolve a quote to its sentence id and build the LLM context. Returns (id_value, context).
+    With compiled context bundles (python -m src.context_bundles) the context is a dict lookup.
+    """
+    with span("load_all"):
+        corpus = get_corpus(DATA_PKS, DATA_BINH, DATA_STYLE)
+        df_pks, _, _ = corpus.frames()
+    with span("find_id_from_quote"):
+        semantic = corpus.semantic_index if QUOTE_MATCH == "hybrid" else None
+        id_value, row_pks = find_id_from_quote(quote, df_pks, index=corpus.quote_index, semantic=semantic)
+    return id_value, context_for_id(corpus, id_value, row_pks)
+
+def save_storyboard(story, id_value, context, output_dir="outputs"):
+    """Write <output_dir>/storyboard.json and log the story. Returns the JSON path."""
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, "storyboard.json")
+    with span("save_storyboard"):
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(story, f, ensure_ascii=False, indent=2)
+    print(f"Saved {json_path}")
+    with span("append_story_log"):
+        append_story_log(
+            quote=context["quote"],
+            story_id=id_value,
+            story_title=story.get("story_title", "Untitled Story"),
+            storyboard_path=json_path,
+            story=story
+            )
+    return json_path
+
+def serve_pregenerated(id_value, context, output_dir="outputs"):
+    """
+    Copy the pregenerated story of id_value into output_dir and log it. False on a
+    miss – including stories generated from another corpus, prompt or model.
+    """
+    with span("pregenerated_lookup"):
+        source = source_signature([DATA_PKS, DATA_BINH, DATA_STYLE])
+        entry = get_pregenerated_store().materialize(id_value, output_dir, source,
+                                                     storyboard_cache_key(context))
+        set_attrs(hit=entry is not None)
+    if entry is None:
+        return False
+    print(f"⚡ Serving pregenerated story for ID {id_value} – {entry.get('story_title', '')}")
+    json_path = os.path.join(output_dir, "storyboard.json")
+    with span("append_story_log"):
+        append_story_log(
+            quote=context["quote"],
+            story_id=id_value,
+            story_title=entry.get("story_title", "Untitled Story"),
+            storyboard_path=json_path
+            )
+    return True
+
+def run_pipeline(quote, stream=None, output_dir="outputs"):
+    """
+    Quote → storyboard → panels → A4 PDF.
+    stream=True (or STREAM_STORYBOARD=true) dispatches each image prompt to the
+    diffusion stage while the storyboard is still being generated.
+    With TRACING=true every stage is recorded as a span (see src/tracing.py).
+    Sentences already produced by `python -m src.pregenerate` are copied from
+    the pregenerated store instead (PREGENERATED=false always generates live).
+    """
+    if stream is None:
+        stream = os.getenv("STREAM_STORYBOARD", "false").lower() == "true"
+    with span("run_pipeline", stream=stream, fast_mode=os.getenv("FAST_MODE", "false").lower() == "true"):
+        id_value, context = prepare_context(quote)
+        set_attrs(id=str(id_value))
+        if PREGENERATED_ENABLED and serve_pregenerated(id_value, context, output_dir):
+            return
+        print(f"📘 Building story for ID {id_value} – {context['quote'][:40]}...")
+        if stream:
+            story = _stream_story_and_panels(context, output_dir)
+            json_path = save_storyboard(story, id_value, context, output_dir)
+            with span("render_story_page"):
+                render_story_page(json_path, output_dir, output_pdf=True)
+            return
+
+        with span("call_gemini"):
+            story = call_gemini(context)
+        json_path = save_storyboard(story, id_value, context, output_dir)
+
+        if "image_prompts" in story:
+            with span("generate_flux_images", panels=len(story["image_prompts"])):
+                generate_flux_images(story["image_prompts"], output_dir=output_dir)
+            with span("render_story_page"):
+                render_story_page(json_path, output_dir, output_pdf=True)
 
 if __name__ == "__main__":
-    run_pipeline("康誥曰：克明德。")
\ No newline at end of file
+    setup_logging()
+    run_pipeline("康誥曰：克明德。")
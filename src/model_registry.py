@@ -0,0 +1,133 @@
+# Process-level registry of loaded diffusion pipelines (load once, keep warm, LRU cap).
+import os
+import gc
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+
+MAX_PIPELINES = int(os.getenv("DIFFUSION_MAX_PIPELINES", "1"))
+
+_PIPELINES = OrderedDict()   # (model_id, device, dtype, variant) → pipeline, most recently used last
+_LOCK = threading.RLock()    # guards _PIPELINES / _LOAD_LOCKS only, never held while loading
+_LOAD_LOCKS = {}             # key → lock held while that pipeline loads
+_default_loader = None
+
+
+def _key(model_id, device, dtype, variant=None):
+    return (model_id, str(device), str(dtype), variant)
+
+
+def set_pipeline_loader(loader):
+    """
+    Override how pipelines are loaded: loader(model_id, device, dtype) → pipeline.
+    Pass None to go back to the loader given by the caller. Unloads everything.
+    """
+    global _default_loader
+    with _LOCK:
+        _default_loader = loader
+    unload()
+
+
+def get_pipeline(model_id, device, dtype, loader=None, variant=None):
+    """
+    Return the resident pipeline for (model_id, device, dtype, variant), loading it on first use.
+    `variant` distinguishes differently configured copies (e.g. inference profiles).
+    When more than MAX_PIPELINES are resident the least recently used one is unloaded.
+    """
+    key = _key(model_id, device, dtype, variant)
+    with _LOCK:
+        pipe = _PIPELINES.get(key)
+        if pipe is not None:
+            _PIPELINES.move_to_end(key)
+            return pipe
+        load = _default_loader or loader
+        if load is None:
+            raise ValueError("No pipeline loader configured.")
+        key_lock = _LOAD_LOCKS.setdefault(key, threading.Lock())
+
+    # Only callers of the same key wait for a multi-GB load; other keys and cache hits go on.
+    with key_lock:
+        with _LOCK:
+            pipe = _PIPELINES.get(key)
+            if pipe is not None:
+                _PIPELINES.move_to_end(key)
+                return pipe
+        print(f"🧠 Loading pipeline into registry: {model_id} [{device}, {dtype}]")
+        pipe = load(model_id, device, dtype)
+        with _LOCK:
+            _PIPELINES[key] = pipe
+            evicted = 0
+            while len(_PIPELINES) > max(MAX_PIPELINES, 1):
+                old_key, _ = _PIPELINES.popitem(last=False)
+                print(f"♻️ Evicted pipeline from registry: {old_key[0]} [{old_key[1]}]")
+                evicted += 1
+        if evicted:
+            _free_memory()
+        return pipe
+
+
+def unload(model_id=None, device=None, dtype=None, variant=None):
+    """Unload one pipeline (model_id/device/dtype/variant given) or all of them (no arguments)."""
+    with _LOCK:
+        if model_id is None:
+            _PIPELINES.clear()
+        else:
+            _PIPELINES.pop(_key(model_id, device, dtype, variant), None)
+    _free_memory()
+
+
+def loaded_pipelines():
+    with _LOCK:
+        return list(_PIPELINES)
+
+
+def _free_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+# ===============================
+# DUMMY PIPELINE (offline runs / tests)
+# ===============================
+class _DummyOutput:
+    def __init__(self, images):
+        self.images = images
+
+
+class DummyDiffusionPipeline:
+    """
+    Tiny stand-in with the diffusers call signature; draws the prompt on a blank image.
+    `loads` counts how many were constructed. Use:
+        set_pipeline_loader(DummyDiffusionPipeline.loader)
+    """
+
+    loads = 0
+
+    def __init__(self, model_id="dummy", size=(256, 256)):
+        DummyDiffusionPipeline.loads += 1
+        self.model_id = model_id
+        self.size = size
+        self.calls = 0
+
+    @classmethod
+    def loader(cls, model_id, device, dtype):
+        return cls(model_id)
+
+    def __call__(self, prompt, num_images_per_prompt=1, num_inference_steps=1, callback_on_step_end=None, **kwargs):
+        self.calls += 1
+        if callback_on_step_end is not None:
+            for step in range(num_inference_steps):
+                callback_on_step_end(self, step, None, {})
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        images = []
+        for text in prompts:
+            for _ in range(num_images_per_prompt):
+                img = Image.new("RGB", self.size, "white")
+                ImageDraw.Draw(img).text((10, 10), str(text)[:40], fill="black")
+                images.append(img)
+        return _DummyOutput(images)
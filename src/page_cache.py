@@ -0,0 +1,99 @@
+# Per-page fingerprint manifest + cache of encoded A4 pages for incremental re-rendering.
+import os
+import json
+import hashlib
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+        return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+    except OSError:
+        return [os.path.basename(path), None, None]
+
+
+def page_fingerprint(job, layout):
+    """
+    Hash of everything that affects one composed page: panel files (name, size, mtime),
+    captions (raw moral_link values), title, font, encoding settings and the layout constants.
+    """
+    payload = json.dumps(
+        {
+            "panels": [_file_signature(p) for p in job["image_paths"]],
+            "captions": [p.get("moral_link") if isinstance(p, dict) else None for p in job["panels"]],
+            "title": job["story_title"],
+            "font": job["font_path"],
+            "compression": job["compression"],
+            "jpeg_quality": job["jpeg_quality"],
+            "layout": layout,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """
+    <cache_dir>/page_<n>.bin holds the encoded image stream of page n;
+    manifest.json maps page number → {"fingerprint", "filter", "width", "height"}.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def _path(self, page_num):
+        return os.path.join(self.cache_dir, f"page_{page_num:03d}.bin")
+
+    def is_fresh(self, page_num, fingerprint):
+        entry = self.manifest.get(str(page_num))
+        return (entry is not None and entry["fingerprint"] == fingerprint
+                and os.path.exists(self._path(page_num)))
+
+    def get(self, page_num, fingerprint):
+        """Cached (data, filter_name, width, height) or None when missing/stale."""
+        if not self.is_fresh(page_num, fingerprint):
+            return None
+        entry = self.manifest[str(page_num)]
+        try:
+            with open(self._path(page_num), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data, entry["filter"], entry["width"], entry["height"]
+
+    def put(self, page_num, fingerprint, encoded):
+        data, filter_name, width, height = encoded
+        path = self._path(page_num)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.manifest[str(page_num)] = {
+            "fingerprint": fingerprint, "filter": filter_name, "width": width, "height": height,
+        }
+
+    def discard(self, page_num):
+        self.manifest.pop(str(page_num), None)
+        try:
+            os.remove(self._path(page_num))
+        except OSError:
+            pass
+
+    def prune(self, total_pages):
+        """Drop pages beyond the current page count (story got shorter)."""
+        for key in [k for k in self.manifest if int(k) >= total_pages]:
+            self.discard(int(key))
+
+    def save(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.manifest_path)
@@ -0,0 +1,98 @@
+# Derived panel assets: layout-size image + web thumbnail, produced once and cached next to the panel.
+import os
+from PIL import Image
+
+DERIVED_DIR = ".derived"
+THUMB_SIZE = (480, 480)
+THUMB_QUALITY = 85
+
+# A4 page geometry (used by render_story_page; PANEL_BOX also by generate_flux_images)
+A4_W, A4_H = 2480, 3508  # A4 at 300 DPI
+MARGIN_X, MARGIN_Y = 160, 200
+GRID_TOP = 400
+GRID_BOTTOM = A4_H - 200
+CELL_H = int((GRID_BOTTOM - GRID_TOP - MARGIN_Y) / 2)
+CELL_W = A4_W - 2 * MARGIN_X
+PANEL_BOX = (CELL_W, int(CELL_H * 0.7))  # max panel image size inside a cell
+
+
+def fit_size(width, height, box_w, box_h):
+    """Same fit rule as the A4 layout: full cell width, height capped at box_h."""
+    ratio = width / height
+    new_w = box_w
+    new_h = int(box_w / ratio)
+    if new_h > box_h:
+        new_h = box_h
+        new_w = int(new_h * ratio)
+    return new_w, new_h
+
+
+def _derived_path(panel_path, suffix):
+    folder, name = os.path.split(panel_path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(folder, DERIVED_DIR, f"{stem}.{suffix}")
+
+
+def layout_path(panel_path, box):
+    return _derived_path(panel_path, f"{box[0]}x{box[1]}.png")
+
+
+def thumbnail_path(panel_path):
+    return _derived_path(panel_path, "thumb.jpg")
+
+
+def _is_fresh(derived, source):
+    try:
+        return os.path.getmtime(derived) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def _atomic_save(img, path, **params):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    img.save(tmp, **params)
+    os.replace(tmp, path)
+
+
+def derive_panel_assets(panel_path, box=None, force=False):
+    """
+    Decode the panel once and write the layout-size image (when `box` is given)
+    and the web thumbnail. Up-to-date assets are left alone unless force=True.
+    """
+    need_layout = box is not None and (force or not _is_fresh(layout_path(panel_path, box), panel_path))
+    need_thumb = force or not _is_fresh(thumbnail_path(panel_path), panel_path)
+    if not (need_layout or need_thumb):
+        return
+
+    with Image.open(panel_path) as src:
+        src.load()
+        if need_layout:
+            size = fit_size(src.width, src.height, *box)
+            _atomic_save(src.resize(size, Image.Resampling.LANCZOS), layout_path(panel_path, box),
+                         format="PNG", compress_level=1)
+        if need_thumb:
+            thumb = src.convert("RGB")
+            thumb.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS, reducing_gap=2.0)
+            _atomic_save(thumb, thumbnail_path(panel_path), format="JPEG", quality=THUMB_QUALITY)
+
+
+def load_layout_image(panel_path, box):
+    """Panel resized to the layout box, from the derived cache (created on a miss)."""
+    path = layout_path(panel_path, box)
+    if not _is_fresh(path, panel_path):
+        derive_panel_assets(panel_path, box)
+    img = Image.open(path)
+    img.load()
+    return img
+
+
+def get_thumbnail(panel_path):
+    """Path of the web thumbnail for a panel, created on a miss (falls back to the panel itself)."""
+    path = thumbnail_path(panel_path)
+    if not _is_fresh(path, panel_path):
+        try:
+            derive_panel_assets(panel_path)
+        except OSError:
+            return panel_path
+    return path
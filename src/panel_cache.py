@@ -0,0 +1,152 @@
+# Content-addressed cache of rendered panel images (files + SQLite index, size-capped).
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_DIR = os.getenv("PANEL_CACHE_DIR", "cache/panels")
+DEFAULT_MAX_BYTES = int(float(os.getenv("PANEL_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+
+def panel_cache_key(prompt, model_id, steps, guidance_scale, seed=None, width=None, height=None, profile=None):
+    """SHA-256 over everything that determines the rendered image."""
+    payload = json.dumps(
+        {
+            "prompt": prompt,
+            "model_id": model_id,
+            "steps": steps,
+            "guidance_scale": guidance_scale,
+            "seed": seed,
+            "width": width,
+            "height": height,
+            "profile": profile,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PanelCache:
+    """
+    <cache_dir>/<key>.png indexed by <cache_dir>/index.sqlite (key, size, created, accessed).
+    The index is shared by every process using cache_dir (app workers, batch jobs), so
+    stores and evictions from one are seen by the others. When the total size exceeds
+    max_bytes, least recently used panels are deleted.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.sqlite")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS panels (
+                   key TEXT PRIMARY KEY,
+                   size INTEGER NOT NULL,
+                   created REAL NOT NULL,
+                   accessed REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_panels_accessed ON panels(accessed)")
+        self._conn.commit()
+        self._import_manifest()
+
+    def _import_manifest(self):
+        """Adopt entries of the old manifest.json index so their files are not orphaned."""
+        legacy = os.path.join(self.cache_dir, "manifest.json")
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO panels (key, size, created, accessed) VALUES (?, ?, ?, ?)",
+                [(key, e["size"], e["created"], e["accessed"]) for key, e in manifest.items()
+                 if os.path.exists(self.path_for(key))],
+            )
+        try:
+            os.remove(legacy)
+        except OSError:
+            pass
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def fetch(self, key, dest_path):
+        """Copy the cached panel to dest_path; returns True on a hit."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM panels WHERE key = ?", (key,)).fetchone()
+            try:
+                if row is None:
+                    raise FileNotFoundError(key)
+                shutil.copyfile(self.path_for(key), dest_path)
+            except OSError:
+                # Unknown key, or the file was evicted by another process in between
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM panels WHERE key = ?", (key,))
+                self.misses += 1
+                return False
+            with self._conn:
+                self._conn.execute("UPDATE panels SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return True
+
+    def store(self, key, image_path):
+        """Add a freshly rendered panel file to the cache."""
+        with self._lock:
+            dst = self.path_for(key)
+            tmp = f"{dst}.{os.getpid()}.tmp"
+            shutil.copyfile(image_path, tmp)
+            os.replace(tmp, dst)
+            now = time.time()
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO panels (key, size, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, os.path.getsize(dst), now, now),
+                )
+                self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM panels").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM panels ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+            total -= size
+            self._conn.execute("DELETE FROM panels WHERE key = ?", (key,))
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM panels").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM panels").fetchone()[0]
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_panel_cache():
+    """Process-wide cache instance at DEFAULT_CACHE_DIR."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = PanelCache()
+        return _default_cache
@@ -0,0 +1,141 @@
+# Incremental PDF writer: each page image is written to disk as soon as it is added.
+import io
+import os
+import zlib
+
+COMPRESSIONS = ("jpeg", "flate")
+DEFAULT_COMPRESSION = os.getenv("PDF_COMPRESSION", "jpeg")
+DEFAULT_JPEG_QUALITY = int(os.getenv("PDF_JPEG_QUALITY", "75"))  # Pillow's PDF default
+DEFAULT_FLATE_LEVEL = int(os.getenv("PDF_FLATE_LEVEL", "6"))
+
+
+def encode_page(image, compression=DEFAULT_COMPRESSION, jpeg_quality=DEFAULT_JPEG_QUALITY,
+                flate_level=DEFAULT_FLATE_LEVEL):
+    """
+    Encode a page image into a PDF image stream.
+    Returns (data, filter_name, width, height) – picklable, so workers can encode.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown PDF compression '{compression}' (choose from {', '.join(COMPRESSIONS)})")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if compression == "jpeg":
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=jpeg_quality)
+        return buf.getvalue(), "DCTDecode", image.width, image.height
+    return zlib.compress(image.tobytes(), flate_level), "FlateDecode", image.width, image.height
+
+
+class StreamingPDFWriter:
+    """
+    Writes one full-page image per page, appending objects to the file as pages arrive;
+    the page tree, catalog and xref table are written on close(). Memory use is
+    one encoded page at a time regardless of how many pages the document has.
+    Pages go to <path>.tmp, which replaces `path` on close(): an existing PDF stays
+    intact while a new one is written, and abort() leaves it untouched.
+
+        with StreamingPDFWriter(path) as pdf:
+            for page in pages:
+                pdf.add_page(page)
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path, resolution=300.0, compression=DEFAULT_COMPRESSION,
+                 jpeg_quality=DEFAULT_JPEG_QUALITY, flate_level=DEFAULT_FLATE_LEVEL):
+        self.path = path
+        self.resolution = resolution
+        self.compression = compression
+        self.jpeg_quality = jpeg_quality
+        self.flate_level = flate_level
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 3
+        self.closed = False
+        self.tmp_path = path + ".tmp"
+        self.f = open(self.tmp_path, "wb")
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _new_id(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _write_obj(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.f.tell()
+        self.f.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        self.f.write(body)
+        if stream is not None:
+            self.f.write(b"\nstream\n")
+            self.f.write(stream)
+            self.f.write(b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add_page(self, image):
+        """Encode and write a page image; the caller can drop the image right after."""
+        data, filter_name, width, height = encode_page(
+            image, self.compression, self.jpeg_quality, self.flate_level)
+        self.add_encoded_page(data, filter_name, width, height)
+
+    def add_encoded_page(self, data, filter_name, width, height):
+        """Write a page from an already encoded image stream (see encode_page)."""
+        image_id, content_id, page_id = self._new_id(), self._new_id(), self._new_id()
+        w_pt = width * 72.0 / self.resolution
+        h_pt = height * 72.0 / self.resolution
+
+        self._write_obj(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /{filter_name} "
+            f"/Length {len(data)} >>").encode("ascii"), data)
+
+        content = f"q {w_pt:.4f} 0 0 {h_pt:.4f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._write_obj(content_id, f"<< /Length {len(content)} >>".encode("ascii"), content)
+
+        self._write_obj(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R "
+            f"/MediaBox [0 0 {w_pt:.4f} {h_pt:.4f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>").encode("ascii"))
+        self.page_ids.append(page_id)
+        self.f.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        kids = " ".join(f"{pid} 0 R" for pid in self.page_ids)
+        self._write_obj(self.PAGES_ID,
+                        f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode("ascii"))
+        self._write_obj(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode("ascii"))
+
+        xref_pos = self.f.tell()
+        size = self.next_id
+        self.f.write(f"xref\n0 {size}\n".encode("ascii"))
+        self.f.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, size):
+            self.f.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode("ascii"))
+        self.f.write((f"trailer\n<< /Size {size} /Root {self.CATALOG_ID} 0 R >>\n"
+                      f"startxref\n{xref_pos}\n%%EOF\n").encode("ascii"))
+        self.f.close()
+        self.closed = True
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Close and delete the partially written file; a previous PDF at path is kept."""
+        if not self.closed:
+            self.f.close()
+            self.closed = True
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,194 @@
+# Offline pre-generation of every sentence's comic, resumable from a checkpoint manifest.
+import os
+import time
+import json
+import threading
+from .main_pipeline import (DATA_PKS, DATA_BINH, DATA_STYLE, LLM_CACHE_ENABLED, context_for_id,
+                            call_gemini, save_storyboard, storyboard_cache_key)
+from .corpus_store import get_corpus
+from .context_bundles import REQUIRED_FIELDS
+from .quote_index import source_signature
+from .llm_cache import get_llm_cache
+from .generate_flux_images import generate_flux_images
+from .render_story_page import render_story_page, setup_logging
+from .pregenerated import PregeneratedStore, DEFAULT_ROOT, clear_story_outputs
+from .tracing import span
+
+DEFAULT_LLM_RATE = float(os.getenv("PREGENERATE_LLM_RATE", "10"))  # Gemini calls per minute, 0 = unlimited
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart (per_minute <= 0 disables it)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute and per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+
+def _llm_cached(context):
+    """True when call_gemini would answer from the LLM cache (no API call, nothing to throttle)."""
+    if not LLM_CACHE_ENABLED:
+        return False
+    return get_llm_cache().contains(storyboard_cache_key(context))
+
+
+def _load_storyboard(json_path):
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pregenerate_one(corpus, sent_id, store, limiter):
+    """
+    context → (throttled) storyboard → panels → A4 PDF into <root>/<sent_id>/,
+    checkpointing the manifest after each stage. A storyboard.json left by an
+    interrupted run of the same context is reused, so a resumed id never calls
+    the LLM twice; otherwise the directory is cleared first. Entries are stamped with the corpus signature and LLM cache key.
+    """
+    output_dir = store.story_dir(sent_id)
+    entry = store.entries().get(sent_id, {})
+    store.update(sent_id, status="running", stage="context", output_dir=output_dir,
+                 attempts=entry.get("attempts", 0) + 1, error=None)
+    stage = "context"
+    try:
+        with span("pregenerate", id=sent_id):
+            context = context_for_id(corpus, sent_id, corpus.sent_rows[sent_id])
+            missing = [f for f in REQUIRED_FIELDS if not context.get(f)]
+            if missing:
+                raise ValueError(f"empty context fields: {', '.join(missing)}")
+            source = [list(s) for s in source_signature(corpus.paths)]
+            llm_key = storyboard_cache_key(context)
+
+            stage = "llm"
+            json_path = os.path.join(output_dir, "storyboard.json")
+            resumable = (entry.get("stage") in ("panels", "render") and entry.get("llm_key") == llm_key
+                         and entry.get("source") == source)
+            story = _load_storyboard(json_path) if resumable else None
+            if story is None:
+                # New storyboard: panels, pages and PDF of a previous one must not leak into it
+                clear_story_outputs(output_dir)
+                if not _llm_cached(context):
+                    waited = limiter.wait()
+                    if waited:
+                        print(f"⏳ LLM throttle: waited {waited:.1f}s")
+                with span("call_gemini"):
+                    story = call_gemini(context)
+                json_path = save_storyboard(story, sent_id, context, output_dir)
+            store.update(sent_id, stage="panels", story_title=story.get("story_title", "Untitled Story"),
+                         source=source, llm_key=llm_key)
+
+            stage = "panels"
+            if "image_prompts" not in story:
+                raise ValueError("storyboard has no image_prompts")
+            with span("generate_flux_images", panels=len(story["image_prompts"])):
+                generate_flux_images(story["image_prompts"], output_dir=output_dir)
+            store.update(sent_id, stage="render")
+
+            stage = "render"
+            with span("render_story_page"):
+                meta = render_story_page(json_path, output_dir, output_pdf=True)
+            # render_story_page logs its own errors and returns None instead of raising
+            if not meta:
+                raise RuntimeError("render_story_page failed (see logs/render_story_*.log)")
+            if meta.get("pages_failed"):
+                raise RuntimeError(f"{meta['pages_failed']} of {meta['total_pages']} pages failed to render")
+            pdf_path = meta.get("pdf_path")
+            if not pdf_path or not os.path.exists(pdf_path):
+                raise RuntimeError("no PDF was written")
+    except Exception as e:
+        store.update(sent_id, status="failed", error=f"{stage}: {e}")
+        print(f"❌ {sent_id} failed at {stage}: {e}")
+        return False
+    store.update(sent_id, status="done", stage="done", pdf_path=pdf_path)
+    return True
+
+
+def _is_current(corpus, sent_id, store):
+    """Done and stamped with the current corpus and storyboard cache key."""
+    context = context_for_id(corpus, sent_id, corpus.sent_rows[sent_id])
+    return store.get(sent_id, source_signature(corpus.paths), storyboard_cache_key(context)) is not None
+
+
+def pregenerate_all(ids=None, root=DEFAULT_ROOT, llm_rate=DEFAULT_LLM_RATE, force=False,
+                    retry_failed=True, limit=None):
+    """
+    Walk every sent_id of the corpus (or `ids`) in order, skipping those the manifest
+    marks done for the current corpus and prompt unless force=True. Sequential on purpose: diffusion owns the GPU and
+    the LLM is rate-limited anyway. Refuses to run with FAST_MODE=true. Returns {"done", "skipped", "failed"} counts.
+    """
+    if os.getenv("FAST_MODE", "false").lower() == "true":
+        # mock panels would be stamped done and served to users as real stories
+        raise ValueError("FAST_MODE=true renders mock panels – unset it to pre-generate")
+    corpus = get_corpus(DATA_PKS, DATA_BINH, DATA_STYLE)
+    store = PregeneratedStore(root)
+    limiter = RateLimiter(llm_rate)
+    ids = [str(i) for i in ids] if ids else list(corpus.sent_rows)
+    unknown = [i for i in ids if i not in corpus.sent_rows]
+    if unknown:
+        raise ValueError(f"Unknown sent_id(s): {', '.join(unknown)}")
+
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    todo = []
+    for sent_id in ids:
+        status = store.entries().get(sent_id, {}).get("status")
+        current = status == "done" and _is_current(corpus, sent_id, store)
+        if not force and (current or (status == "failed" and not retry_failed)):
+            counts["skipped"] += 1
+        else:
+            todo.append(sent_id)
+    if limit is not None:
+        todo = todo[:limit]
+    print(f"🗂️ {len(ids)} sentences: {counts['skipped']} already handled, {len(todo)} to generate → {root}")
+
+    t_start = time.perf_counter()
+    for n, sent_id in enumerate(todo, start=1):
+        print(f"📘 [{n}/{len(todo)}] {sent_id}")
+        if force:
+            store.update(sent_id, stage="context")  # regenerate the storyboard as well
+        ok = pregenerate_one(corpus, sent_id, store, limiter)
+        counts["done" if ok else "failed"] += 1
+    print(f"✅ Pre-generation finished in {time.perf_counter() - t_start:.1f}s: "
+          f"{counts['done']} generated, {counts['skipped']} skipped, {counts['failed']} failed")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-generate the comic of every sentence (resumable)")
+    parser.add_argument("ids", nargs="*", help="sent_ids to generate (default: the whole corpus)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Output root holding manifest.json")
+    parser.add_argument("--llm-rate", type=float, default=DEFAULT_LLM_RATE,
+                        help="Max Gemini calls per minute (0 = unlimited)")
+    parser.add_argument("--limit", type=int, help="Generate at most N sentences this run")
+    parser.add_argument("--force", action="store_true", help="Regenerate ids already marked done")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry ids that failed before")
+    parser.add_argument("--status", action="store_true", help="Only print the manifest summary")
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.status:
+        entries = PregeneratedStore(args.root).entries()
+        by_status = {}
+        for sent_id, entry in entries.items():
+            by_status.setdefault(entry.get("status"), []).append(sent_id)
+        total = len(get_corpus(DATA_PKS, DATA_BINH, DATA_STYLE).sent_rows)
+        print(f"🗂️ {args.root}: {len(by_status.get('done', []))}/{total} sentences pregenerated")
+        for status, ids in sorted(by_status.items(), key=lambda kv: str(kv[0])):
+            if status != "done":
+                print(f"  {status}: {', '.join(ids[:10])}{' …' if len(ids) > 10 else ''}")
+    else:
+        pregenerate_all(args.ids, root=args.root, llm_rate=args.llm_rate, force=args.force,
+                        retry_failed=not args.skip_failed, limit=args.limit)
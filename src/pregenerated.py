@@ -0,0 +1,128 @@
+# Lookup store of pregenerated comics (sent_id → output directory), backed by the batch job's manifest.
+import os
+import re
+import json
+import glob
+import time
+import shutil
+import threading
+
+DEFAULT_ROOT = os.getenv("PREGENERATED_DIR", "pregenerated")
+MANIFEST = "manifest.json"
+
+# Files a story directory contributes to the app's output folder
+_OUTPUT_PATTERNS = ("panel_*.png", "comic_page_A4_*.png", "comic_story_full.pdf", "storyboard.json")
+_OUTPUT_DIRS = (".derived", ".page_cache")
+
+
+def clear_story_outputs(output_dir):
+    """Remove a previous story's panels, pages, PDF, storyboard and derived caches."""
+    for pattern in _OUTPUT_PATTERNS:
+        for path in glob.glob(os.path.join(output_dir, pattern)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    for name in _OUTPUT_DIRS:
+        shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+
+
+def _signature_json(source):
+    return [list(s) for s in source] if source is not None else None
+
+
+class PregeneratedStore:
+    """
+    <root>/manifest.json: {sent_id: {"status", "output_dir", "pdf_path", "story_title",
+    "stage", "attempts", "error", "updated", "source", "llm_key"}} – written by
+    src/pregenerate.py after every stage (checkpoint) and read here for lookups;
+    re-read when its mtime changes. "source" is the corpus source_signature and
+    "llm_key" the storyboard cache key the story was generated from: an entry whose
+    stamps differ from the caller's is stale and treated as a miss.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._entries = {}
+
+    # ---------- manifest ----------
+    def entries(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except OSError:
+                self._mtime, self._entries = None, {}
+                return self._entries
+            if mtime != self._mtime:
+                try:
+                    with open(self.manifest_path, "r", encoding="utf-8") as f:
+                        self._entries = json.load(f)
+                    self._mtime = mtime
+                except (OSError, ValueError):
+                    pass  # being replaced right now; keep the previous view
+            return self._entries
+
+    def update(self, sent_id, **fields):
+        """Merge fields into one entry and write the manifest atomically (single writer: the batch job)."""
+        entries = dict(self.entries())
+        entry = dict(entries.get(sent_id, {}))
+        entry.update(fields, updated=time.time())
+        entries[sent_id] = entry
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.manifest_path)
+        with self._lock:
+            self._entries = entries
+            self._mtime = os.stat(self.manifest_path).st_mtime_ns
+        return entry
+
+    def story_dir(self, sent_id):
+        return os.path.join(self.root, re.sub(r"[^\w.-]+", "_", str(sent_id)).strip("_") or "story")
+
+    # ---------- lookups ----------
+    def get(self, sent_id, source, llm_key):
+        """
+        The finished entry for sent_id, or None: missing, unfinished, storyboard or PDF gone, or
+        generated from another corpus (source) or prompt/model (llm_key).
+        """
+        entry = self.entries().get(str(sent_id))
+        if not entry or entry.get("status") != "done":
+            return None
+        if entry.get("source") != _signature_json(source) or entry.get("llm_key") != llm_key:
+            return None
+        if not os.path.exists(os.path.join(entry["output_dir"], "storyboard.json")):
+            return None
+        if not entry.get("pdf_path") or not os.path.exists(entry["pdf_path"]):
+            return None
+        return entry
+
+    def materialize(self, sent_id, output_dir, source, llm_key):
+        """
+        Copy a pregenerated story into output_dir (replacing the previous story there),
+        preserving mtimes. Returns the entry, or None on a miss (see get).
+        """
+        entry = self.get(sent_id, source, llm_key)
+        if entry is None:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        clear_story_outputs(output_dir)
+        shutil.copytree(entry["output_dir"], output_dir, dirs_exist_ok=True)
+        return entry
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_pregenerated_store():
+    """Process-wide store at DEFAULT_ROOT."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = PregeneratedStore()
+        return _default_store
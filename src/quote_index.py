@@ -0,0 +1,121 @@
+# Pre-built quote-matching index for find_id_from_quote.
+import os
+import pickle
+from rapidfuzz import process, fuzz
+
+INDEX_VERSION = 3
+SEARCH_ORDER = ["M", "V", "C"]  # same column priority as the original full scan
+
+
+def source_signature(paths):
+    """(path, mtime_ns, size) for every source file – used to invalidate the pickle."""
+    sig = []
+    for p in paths:
+        st = os.stat(p)
+        sig.append((os.path.abspath(p), st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def default_index_path(csv_path):
+    root, _ = os.path.splitext(csv_path)
+    return root + ".quoteidx.pkl"
+
+
+class QuoteIndex:
+    """
+    Preprocessed view of the C/V/M columns of TuThu_PKS_007.csv: the strings
+    RapidFuzz scores, built once instead of converting three DataFrame columns
+    on every quote. Search scores every row, so the result is exactly the full
+    scan's – token_set_ratio has no cheap upper bound that would let an n-gram or
+    token index skip rows safely (dissimilar tokens still score on characters).
+    """
+
+    def __init__(self, columns, texts, source=None):
+        self.columns = columns
+        self.texts = texts
+        self.source = source
+
+    @classmethod
+    def from_dataframe(cls, df_pks, source=None):
+        """df_pks may be a DataFrame or a ColumnarTable."""
+        from .columnar import text_values
+        columns = [c for c in SEARCH_ORDER if c in df_pks.columns]
+        if not columns:
+            raise ValueError("Dataset is missing all 3 columns C/V/M.")
+        return cls(columns, {col: text_values(df_pks, col) for col in columns}, source=source)
+
+    def search(self, quote):
+        """
+        Return (best_idx, best_score, best_col) or None: the best token_set_ratio
+        over columns M → V → C, first row on ties – the same as the original scan.
+        """
+        best_score = -1
+        best_idx = None
+        best_col = None
+
+        for col in self.columns:
+            try:
+                result = process.extractOne(quote, self.texts[col], scorer=fuzz.token_set_ratio)
+            except Exception:
+                continue
+            if result is None:
+                continue
+            _, score, idx = result
+
+            if score > best_score:
+                best_score = score
+                best_idx = idx
+                best_col = col
+
+        if best_idx is None:
+            return None
+        return int(best_idx), best_score, best_col
+
+    # ---------- persistence ----------
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": INDEX_VERSION, "source": self.source, "columns": self.columns,
+                         "texts": self.texts}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, source=None):
+        """Load a pickled index; returns None if missing, stale or from another version."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        if source is not None and data.get("source") != source:
+            return None
+        return cls(data["columns"], data["texts"], source=data.get("source"))
+
+
+def load_quote_index(pks_path, df_pks=None, index_path=None):
+    """
+    Load the serialized index next to the CSV, rebuilding it when the CSV changed.
+    """
+    index_path = index_path or default_index_path(pks_path)
+    source = source_signature([pks_path])
+    index = QuoteIndex.load(index_path, source=source)
+    if index is not None:
+        return index
+
+    if df_pks is None:
+        import pandas as pd
+        from .columnar import clean_column_name
+        df_pks = pd.read_csv(pks_path)
+        df_pks.columns = [clean_column_name(c) for c in df_pks.columns]
+    index = QuoteIndex.from_dataframe(df_pks, source=source)
+    try:
+        index.save(index_path)
+        print(f"🗂️ Built quote index → {index_path}")
+    except OSError as e:
+        print(f"⚠️ Could not save quote index: {e}")
+    return index
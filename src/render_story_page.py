@@ -1,32 +1,180 @@
 # Description: Render story pages in premium A4 layout with 2 panels per page.
-import os, json, math, textwrap, logging, traceback
+import os, json, math, logging, traceback
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+from .font_registry import find_font_path, get_font, text_width, wrap_text
+from .panel_assets import (load_layout_image, A4_W, A4_H, MARGIN_X, MARGIN_Y,
+                           GRID_TOP, CELL_H, CELL_W, PANEL_BOX)
+from .page_cache import PageCache, page_fingerprint
+from .pdf_writer import StreamingPDFWriter, encode_page, DEFAULT_COMPRESSION, DEFAULT_JPEG_QUALITY
 
 # ===============================
 # LOGGING CONFIGURATION
 # ===============================
 LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-log_file = os.path.join(LOG_DIR, f"render_story_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+_log_file = None
 
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%H:%M:%S"))
-logging.getLogger().addHandler(console)
+def setup_logging():
+    """Log to logs/render_story_<ts>.log and the console. Called by entry points, never at import,
+    so page-composition worker processes do not each open their own log file. Idempotent."""
+    global _log_file
+    if _log_file:
+        return _log_file
+    os.makedirs(LOG_DIR, exist_ok=True)
+    _log_file = os.path.join(LOG_DIR, f"render_story_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+
+    logging.basicConfig(
+        filename=_log_file,
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%H:%M:%S"))
+    logging.getLogger().addHandler(console)
+    return _log_file
+
+
+# ===============================
+# LAYOUT CONFIG
+# ===============================
+# Page/grid geometry (A4_W … PANEL_BOX) lives in panel_assets.py, shared with the diffusion stage.
+PANELS_PER_PAGE = 2
+BG_COLOR = (255, 255, 255)
+
+# FONT DETECTION – PRIORITIZE CJK FONTS
+FONT_CANDIDATES = [
+    "assets/fonts/NotoSansSC-Regular.otf",
+    "assets/fonts/NotoSerifSC-Regular.otf",
+    os.path.expanduser("~/Library/Fonts/NotoSansSC[wght].ttf"),
+    os.path.expanduser("~/Library/Fonts/NotoSerifSC-Regular.otf"),
+    "/Library/Fonts/NotoSansSC[wght].ttf",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "assets/fonts/NotoSans-Regular.ttf"
+]
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+TITLE_SIZE, BODY_SIZE, CAPTION_SIZE = 100, 35, 45
+CAPTION_MAX_LINES = 8
+
+# Everything layout-related that should invalidate cached pages when changed.
+LAYOUT_VERSION = "3.3"
+LAYOUT_SIGNATURE = {
+    "version": LAYOUT_VERSION,
+    "page": [A4_W, A4_H, MARGIN_X, MARGIN_Y, PANELS_PER_PAGE, list(BG_COLOR), list(PANEL_BOX)],
+    "fonts": [TITLE_SIZE, BODY_SIZE, CAPTION_SIZE, CAPTION_MAX_LINES],
+}
+PAGE_CACHE_DIR = ".page_cache"
+
+
+def _load_fonts(font_path):
+    # Fonts come from the process-wide registry: each worker loads them once.
+    return (get_font(font_path, TITLE_SIZE),
+            get_font(font_path, BODY_SIZE),
+            get_font(font_path, CAPTION_SIZE))
+
+
+def _caption_text(panel):
+    """moral_link of one storyboard panel as text ("" when missing, None or not a panel dict)."""
+    if not isinstance(panel, dict):
+        return ""
+    return str(panel.get("moral_link") or "").strip()
+
+
+def _compose_page(job):
+    """
+    Build one A4 page (runs in a worker process) and encode it as a PDF image stream.
+    Returns (page_num, encode_page(...) tuple or None, error message or None) – a failing
+    page never takes the other pages down.
+    """
+    page_num = job["page_num"]
+    try:
+        title_font, body_font, caption_font = _load_fonts(job["font_path"])
+        story_title = job["story_title"]
+
+        page = Image.new("RGB", (A4_W, A4_H), color=BG_COLOR)
+        draw = ImageDraw.Draw(page)
+
+        # HEADER
+        title_y = 80
+        title_w = text_width(story_title, title_font)
+        draw.text(((A4_W - title_w) / 2, title_y), story_title, fill=(0, 0, 0), font=title_font)
+
+        grid_top = GRID_TOP
+        cell_h = CELL_H
+        cell_w = CELL_W
+
+        # RENDER EACH PANEL
+        for i, (img_path, panel) in enumerate(zip(job["image_paths"], job["panels"])):
+            fname = os.path.basename(img_path)
+            try:
+                caption_text = _caption_text(panel)
+                if not os.path.exists(img_path):
+                    logging.warning(f"Panel image not found: {fname}")
+                    continue
+
+                # Layout-size image, resized once and cached in .derived/
+                panel_img = load_layout_image(img_path, PANEL_BOX)
+                new_w, new_h = panel_img.size
+
+                x = MARGIN_X + (cell_w - new_w)//2
+                y = grid_top + i * (cell_h + MARGIN_Y//2)
+                page.paste(panel_img, (x, y))
+
+                # CAPTION
+                caption_y = y + new_h + 50
+
+                if caption_text:
+                    wrapped_lines = wrap_text(caption_text, caption_font, cell_w)
+                    line_height = int(caption_font.size * 1.5)
+                    for j, line in enumerate(wrapped_lines[:CAPTION_MAX_LINES]):
+                        lw = text_width(line, caption_font)
+                        draw.text(
+                            (MARGIN_X + (cell_w - lw) / 2, caption_y + j * line_height),
+                            line,
+                            fill=(0, 0, 0),
+                            font=caption_font
+                        )
+            except Exception as e:
+                logging.error(f"Error rendering panel {fname}: {e}")
+                logging.debug(traceback.format_exc())
+
+        # FOOTER
+        footer_text = "Philosophy Unfolded – The Great Learning (大学 / Đại Học)"
+        fw = text_width(footer_text, body_font)
+        draw.text(((A4_W - fw) / 2, A4_H - 130), footer_text, fill=(100, 100, 100), font=body_font)
+
+        encoded = encode_page(page, job["compression"], job["jpeg_quality"])
+        return page_num, encoded, None
+    except Exception as e:
+        logging.debug(traceback.format_exc())
+        return page_num, None, str(e)
+
+
+def _iter_composed_pages(jobs, workers):
+    """Yield (page_num, encoded_page, error) in page order, using a process pool when workers > 1."""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _compose_page(job)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        yield from pool.map(_compose_page, jobs)
 
 
 def render_story_page(
     json_path="outputs/storyboard.json",
     panels_dir="outputs",
-    output_pdf=True
+    output_pdf=True,
+    workers=None,
+    pdf_compression=None,
+    jpeg_quality=None,
+    incremental=True
 ):
     """
     Philosophy-Unfolded – Premium A4 Layout v3.3
@@ -34,9 +182,16 @@ def render_story_page(
     • 2 panels per A4 page – optimized for clear, large storytelling
     • Auto font detection for Chinese/Vietnamese (Noto Sans/Serif SC)
     • Balanced text sizes (~12–14pt printed)
+    • Pages composed in parallel (workers, default RENDER_WORKERS processes)
+    • PDF streamed page by page (pdf_compression "jpeg"/"flate", jpeg_quality),
+      so memory stays flat regardless of story length; it replaces the previous
+      comic_story_full.pdf only once complete
+    • Incremental: pages whose fingerprint (panel files, captions, title, font,
+      layout) is unchanged are reused from <panels_dir>/.page_cache
     • Returns metadata for Streamlit integration
     """
 
+    writer = None
     try:
         logging.info(f"=== Render Story Started ===")
         logging.info(f"JSON Path: {json_path}")
@@ -63,130 +218,106 @@ def render_story_page(
             logging.warning("⚠️ No panel images found to render.")
             return None
 
-        # CONFIG
-        A4_W, A4_H = 2480, 3508  # A4 at 300 DPI
-        MARGIN_X, MARGIN_Y = 160, 200
-        PANELS_PER_PAGE = 2
-        BG_COLOR = (255, 255, 255)
-
-        # FONT DETECTION – PRIORITIZE CJK FONTS
-        font_candidates = [
-            "assets/fonts/NotoSansSC-Regular.otf",
-            "assets/fonts/NotoSerifSC-Regular.otf",
-            os.path.expanduser("~/Library/Fonts/NotoSansSC[wght].ttf"),
-            os.path.expanduser("~/Library/Fonts/NotoSerifSC-Regular.otf"),
-            "/Library/Fonts/NotoSansSC[wght].ttf",
-            "/System/Library/Fonts/STHeiti Light.ttc",
-            "assets/fonts/NotoSans-Regular.ttf"
-        ]
-        font_path = next((f for f in font_candidates if os.path.exists(f)), None)
-
+        font_path = find_font_path(tuple(FONT_CANDIDATES))
         if font_path:
             logging.info(f"Using font: {font_path}")
-            title_font   = ImageFont.truetype(font_path, 100)
-            body_font    = ImageFont.truetype(font_path, 35)
-            caption_font = ImageFont.truetype(font_path, 45)
         else:
             logging.warning("⚠️ No CJK font found — fallback to default.")
-            title_font = ImageFont.load_default()
-            body_font = ImageFont.load_default()
-            caption_font = ImageFont.load_default()
 
-        # PAGE RENDERING LOOP
+        # PAGE JOBS
         total_panels = len(image_files)
         total_pages = math.ceil(total_panels / PANELS_PER_PAGE)
-        pdf_pages = []
+        workers = RENDER_WORKERS if workers is None else workers
+        pdf_compression = pdf_compression or DEFAULT_COMPRESSION
+        jpeg_quality = jpeg_quality or DEFAULT_JPEG_QUALITY
 
-        logging.info(f"Rendering {total_panels} panels → {total_pages} A4 pages")
+        logging.info(f"Rendering {total_panels} panels → {total_pages} A4 pages ({workers} workers)")
 
+        jobs = []
         for page_num in range(total_pages):
-            try:
-                start_idx = page_num * PANELS_PER_PAGE
-                end_idx = min(start_idx + PANELS_PER_PAGE, total_panels)
-                batch_files = image_files[start_idx:end_idx]
-
-                page = Image.new("RGB", (A4_W, A4_H), color=BG_COLOR)
-                draw = ImageDraw.Draw(page)
-
-                # HEADER
-                title_y = 80
-                title_w = draw.textlength(story_title, font=title_font)
-                draw.text(((A4_W - title_w) / 2, title_y), story_title, fill=(0, 0, 0), font=title_font)
-
-                # GRID CONFIG
-                grid_top = 400
-                grid_bottom = A4_H - 200
-                available_h = grid_bottom - grid_top
-                cell_h = int((available_h - MARGIN_Y) / 2)
-                cell_w = A4_W - 2 * MARGIN_X
-
-                # RENDER EACH PANEL
-                for i, fname in enumerate(batch_files):
-                    try:
-                        img_path = os.path.join(panels_dir, fname)
-                        if not os.path.exists(img_path):
-                            logging.warning(f"Panel image not found: {fname}")
-                            continue
-
-                        panel_img = Image.open(img_path)
-                        img_ratio = panel_img.width / panel_img.height
-
-                        # Resize image
-                        new_w = cell_w
-                        new_h = int(cell_w / img_ratio)
-                        if new_h > int(cell_h * 0.7):
-                            new_h = int(cell_h * 0.7)
-                            new_w = int(new_h * img_ratio)
-                        panel_img = panel_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-
-                        x = MARGIN_X + (cell_w - new_w)//2
-                        y = grid_top + i * (cell_h + MARGIN_Y//2)
-                        page.paste(panel_img, (x, y))
-
-                        # CAPTION
-                        caption_y = y + new_h + 50
-                        global_idx = start_idx + i
-                        caption_text = panels[global_idx].get("moral_link", "").strip() if global_idx < len(panels) else ""
-
-                        if caption_text:
-                            wrapped_lines = textwrap.wrap(caption_text, width=80)
-                            line_height = int(caption_font.size * 1.5)
-                            for j, line in enumerate(wrapped_lines[:8]):
-                                lw = draw.textlength(line, font=caption_font)
-                                draw.text(
-                                    (MARGIN_X + (cell_w - lw) / 2, caption_y + j * line_height),
-                                    line,
-                                    fill=(0, 0, 0),
-                                    font=caption_font
-                                )
-                    except Exception as e:
-                        logging.error(f"Error rendering panel {fname}: {e}")
-                        logging.debug(traceback.format_exc())
-
-                # FOOTER
-                footer_text = "Philosophy Unfolded – The Great Learning (大学 / Đại Học)"
-                fw = draw.textlength(footer_text, font=body_font)
-                draw.text(((A4_W - fw) / 2, A4_H - 130), footer_text, fill=(100, 100, 100), font=body_font)
-
-                pdf_pages.append(page)
-                logging.info(f"✅ Rendered page {page_num + 1}/{total_pages}")
+            start_idx = page_num * PANELS_PER_PAGE
+            end_idx = min(start_idx + PANELS_PER_PAGE, total_panels)
+            # raw storyboard panels: captions are built inside each panel's guarded block
+            page_panels = [panels[idx] if idx < len(panels) else None for idx in range(start_idx, end_idx)]
+            jobs.append({
+                "page_num": page_num,
+                "story_title": story_title,
+                "font_path": font_path,
+                "image_paths": [os.path.join(panels_dir, f) for f in image_files[start_idx:end_idx]],
+                "panels": page_panels,
+                "compression": pdf_compression,
+                "jpeg_quality": jpeg_quality,
+            })
+
+        # DIRTY PAGES – only pages whose inputs changed are recomposed
+        page_cache = PageCache(os.path.join(panels_dir, PAGE_CACHE_DIR)) if incremental else None
+        fingerprints = [page_fingerprint(job, LAYOUT_SIGNATURE) for job in jobs]
+        dirty_jobs = [
+            job for job, fp in zip(jobs, fingerprints)
+            if page_cache is None or not page_cache.is_fresh(job["page_num"], fp)
+        ]
+        dirty_pages = {job["page_num"] for job in dirty_jobs}
+        if page_cache is not None:
+            logging.info(f"♻️ {total_pages - len(dirty_pages)} cached pages, {len(dirty_pages)} to recompose")
+        composed = _iter_composed_pages(dirty_jobs, workers)
 
+        # PDF STREAMING – each page is written as soon as it is ready, then dropped
+        out_pdf = None
+        writer = None
+        pdf_failed = False
+        failed_pages = 0
+        for job, fp in zip(jobs, fingerprints):
+            page_num = job["page_num"]
+            encoded = None
+            if page_num not in dirty_pages:
+                encoded = page_cache.get(page_num, fp)
+                if encoded is not None:
+                    logging.info(f"♻️ Reused page {page_num + 1}/{total_pages}")
+            if encoded is None:
+                if page_num in dirty_pages:
+                    _, encoded, error = next(composed)
+                else:  # cache file vanished between the check and the read
+                    _, encoded, error = _compose_page(job)
+                if error is not None:
+                    logging.error(f"Error rendering page {page_num + 1}: {error}")
+                    failed_pages += 1
+                    if page_cache is not None:
+                        page_cache.discard(page_num)
+                    continue
+                if page_cache is not None:
+                    page_cache.put(page_num, fp, encoded)
+                logging.info(f"✅ Rendered page {page_num + 1}/{total_pages}")
+            if not output_pdf or pdf_failed:
+                continue
+            try:
+                if writer is None:
+                    writer = StreamingPDFWriter(
+                        os.path.join(panels_dir, "comic_story_full.pdf"),
+                        resolution=300.0, compression=pdf_compression, jpeg_quality=jpeg_quality)
+                writer.add_encoded_page(*encoded)
             except Exception as e:
-                logging.error(f"Error rendering page {page_num + 1}: {e}")
+                logging.error(f"PDF export failed: {e}")
                 logging.debug(traceback.format_exc())
+                pdf_failed = True
+                if writer is not None:
+                    writer.abort()
 
-        # PDF MERGE
-        out_pdf = None
-        if output_pdf and pdf_pages:
+        composed.close()
+        if page_cache is not None:
+            page_cache.prune(total_pages)
+            page_cache.save()
+
+        if writer is not None and not pdf_failed:
             try:
-                out_pdf = os.path.join(panels_dir, "comic_story_full.pdf")
-                pdf_pages[0].save(out_pdf, save_all=True, append_images=pdf_pages[1:], resolution=300.0)
+                writer.close()
+                out_pdf = writer.path
                 logging.info(f"🎉 Exported Premium PDF: {out_pdf}")
                 logging.info(f"🖼️ {total_pages} pages | {total_panels} panels total")
                 logging.info(f"🈶 Font used: {font_path}")
             except Exception as e:
                 logging.error(f"PDF export failed: {e}")
                 logging.debug(traceback.format_exc())
+                writer.abort()
 
         logging.info("=== Render Story Completed ===\n")
 
@@ -196,12 +327,16 @@ def render_story_page(
             "total_panels": total_panels,
             "output_dir": panels_dir,
             "pdf_path": out_pdf,
-            "font": font_path
+            "font": font_path,
+            "pages_rendered": len(dirty_pages),
+            "pages_failed": failed_pages
         }
 
     except Exception as e:
         logging.critical(f"Fatal error in render_story_page: {e}")
         logging.debug(traceback.format_exc())
+        if writer is not None:
+            writer.abort()  # drop <pdf>.tmp; the previous PDF is left as it was
         return None
 
 
@@ -209,6 +344,7 @@ def render_story_page(
 # MAIN EXECUTION
 # ===============================
 if __name__ == "__main__":
+    setup_logging()
     result = render_story_page()
     if result:
         logging.info(f"Result: {result}")
@@ -0,0 +1,293 @@
+# Optional dense retrieval for quote matching: memory-mapped float16 sentence embeddings + RapidFuzz re-rank.
+import os
+import json
+import threading
+import numpy as np
+from rapidfuzz import fuzz
+from .quote_index import source_signature
+from .columnar import text_values
+
+INDEX_VERSION = 1
+DEFAULT_MODEL = os.getenv("SEMANTIC_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+SEMANTIC_WEIGHT = float(os.getenv("SEMANTIC_WEIGHT", "0.6"))   # share of cosine in the re-rank score
+COMMENTARY_WEIGHT = 0.9       # a commentary hit counts slightly less than a hit on the sentence itself
+CHUNK_CHARS = 600             # commentary (E) is embedded in passages of about this size
+TOP_K = 32
+MATMUL_ROWS = 65536           # fp16 rows converted to fp32 per matmul block
+
+SENTENCE_COLUMNS = ("C", "V", "M")
+ENTRY_COLUMNS = SENTENCE_COLUMNS + ("E",)
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+# ===============================
+# ENCODER (sentence-transformers, optional)
+# ===============================
+def set_encoder(encoder):
+    """
+    Replace the embedding function: encoder(list_of_texts) → (n, dim) array.
+    Pass None to go back to sentence-transformers (DEFAULT_MODEL).
+    """
+    global _encoder
+    with _encoder_lock:
+        _encoder = encoder
+
+
+def _load_sentence_transformer(model_name):
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise ImportError(
+            "Semantic quote matching needs the optional dependency sentence-transformers "
+            "(pip install sentence-transformers)."
+        ) from e
+    model = SentenceTransformer(model_name, device="cpu")
+    return lambda texts: model.encode(list(texts), batch_size=64, convert_to_numpy=True,
+                                      show_progress_bar=False)
+
+
+def get_encoder(model_name=DEFAULT_MODEL):
+    """The process-wide encoder, loaded on first use."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = _load_sentence_transformer(model_name)
+        return _encoder
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def chunk_text(text, size=CHUNK_CHARS):
+    """Split long commentary into passages of ~size characters, on line breaks where possible."""
+    chunks, current = [], ""
+    for line in str(text).splitlines():
+        line = line.strip()
+        while len(line) > size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:size])
+            line = line[size:]
+        if current and len(current) + len(line) + 1 > size:
+            chunks.append(current)
+            current = ""
+        if line:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ===============================
+# INDEX
+# ===============================
+def default_index_dir(pks_path):
+    root, _ = os.path.splitext(pks_path)
+    return root + ".semidx"
+
+
+class SemanticIndex:
+    """
+    vectors: (n, dim) float16, L2-normalised, memory-mapped from vectors.npy
+    entries: (n, 3) int32 – [pks row or -1, column code (C/V/M/E), section code]
+    Sentence vectors point at their row; commentary passages point at a section,
+    whose sentences are then re-ranked.
+    """
+
+    def __init__(self, vectors, entries, sections, texts, row_sections, model_name, source=None):
+        self.vectors = vectors
+        self.entries = entries
+        self.sections = sections
+        self.texts = texts                  # column → list of row texts (for the RapidFuzz re-rank)
+        self.row_sections = row_sections    # pks row → section code
+        self.model_name = model_name
+        self.source = source
+        self._section_rows = {}
+        for row, sect in enumerate(row_sections):
+            self._section_rows.setdefault(sect, []).append(row)
+
+    @staticmethod
+    def _row_data(df_pks):
+        columns = [c for c in SENTENCE_COLUMNS if c in df_pks.columns]
+        texts = {c: text_values(df_pks, c) for c in columns}
+        sect_ids = text_values(df_pks, "sect_id") if "sect_id" in df_pks.columns else [""] * len(df_pks)
+        sections = sorted(set(sect_ids))
+        code = {s: i for i, s in enumerate(sections)}
+        return texts, sections, [code[s] for s in sect_ids]
+
+    @classmethod
+    def build(cls, df_pks, df_binh=None, encoder=None, model_name=DEFAULT_MODEL, source=None):
+        """Embed every C/V/M sentence and every commentary (E) passage."""
+        encoder = encoder or get_encoder(model_name)
+        texts, sections, row_sections = cls._row_data(df_pks)
+        code = {s: i for i, s in enumerate(sections)}
+
+        items, entries = [], []
+        for col, rows in texts.items():
+            for row, text in enumerate(rows):
+                if text.strip():
+                    items.append(text)
+                    entries.append((row, ENTRY_COLUMNS.index(col), row_sections[row]))
+        if df_binh is not None and "E" in df_binh.columns and "sect_id" in df_binh.columns:
+            for sect_id, text in zip(text_values(df_binh, "sect_id"), text_values(df_binh, "E")):
+                if sect_id not in code:
+                    continue
+                for chunk in chunk_text(text):
+                    items.append(chunk)
+                    entries.append((-1, ENTRY_COLUMNS.index("E"), code[sect_id]))
+
+        vectors = _normalize(encoder(items)).astype(np.float16)
+        return cls(vectors, np.asarray(entries, dtype=np.int32), sections, texts, row_sections,
+                   model_name, source=source)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        for name, arr in (("vectors", self.vectors), ("entries", self.entries)):
+            tmp = os.path.join(index_dir, f"{name}.tmp.npy")
+            np.save(tmp, arr)
+            os.replace(tmp, os.path.join(index_dir, f"{name}.npy"))
+        meta = {"version": INDEX_VERSION, "model": self.model_name, "dim": int(self.vectors.shape[1]),
+                "count": int(self.vectors.shape[0]), "sections": self.sections,
+                "source": [list(s) for s in self.source] if self.source else None}
+        tmp = os.path.join(index_dir, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, os.path.join(index_dir, "meta.json"))
+
+    @classmethod
+    def load(cls, index_dir, df_pks, source=None):
+        """Memory-map a saved index; None if missing, stale or from another version."""
+        try:
+            with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                return None
+            if source is not None and meta.get("source") != [list(s) for s in source]:
+                return None
+            vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+            entries = np.load(os.path.join(index_dir, "entries.npy"))
+        except (OSError, ValueError):
+            return None
+        texts, sections, row_sections = cls._row_data(df_pks)
+        if sections != meta["sections"]:
+            return None
+        return cls(vectors, entries, sections, texts, row_sections, meta["model"], source=source)
+
+    # ---------- search ----------
+    def _lexical(self, quote, row):
+        """Best token_set_ratio of the quote against the row's C/V/M texts → (score, column)."""
+        best, best_col = 0.0, None
+        for col, rows in self.texts.items():
+            score = fuzz.token_set_ratio(quote, rows[row])
+            if score > best:
+                best, best_col = score, col
+        return best, best_col
+
+    def search(self, quote, k=5, extra_rows=(), top_k=TOP_K, weight=SEMANTIC_WEIGHT):
+        """
+        NumPy top-k over the cosine scores, collapsed to pks rows (commentary hits
+        expand to their section's sentences), re-ranked by
+            weight * cosine * 100 + (1 - weight) * token_set_ratio.
+        extra_rows (e.g. the lexical winner) are always re-ranked too.
+        Returns up to k dicts {"row", "score", "cosine", "lexical", "col"}, best first.
+        """
+        q = _normalize(get_encoder(self.model_name)([quote]))[0]
+        # fp16 on disk, fp32 BLAS matmul one block at a time: only MATMUL_ROWS rows are
+        # ever converted, the rest of the matrix stays in the memory map
+        sims = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), MATMUL_ROWS):
+            block = self.vectors[start:start + MATMUL_ROWS]
+            sims[start:start + len(block)] = block.astype(np.float32) @ q
+        top_k = min(top_k, len(sims))
+        top = np.argpartition(-sims, top_k - 1)[:top_k]
+
+        cosine = {}
+        for i in top:
+            row, _, sect = self.entries[i]
+            sim = float(sims[i])
+            if row >= 0:
+                cosine[row] = max(cosine.get(row, -1.0), sim)
+            else:
+                for r in self._section_rows.get(int(sect), ()):
+                    cosine[r] = max(cosine.get(r, -1.0), sim * COMMENTARY_WEIGHT)
+        for row in extra_rows:
+            if row not in cosine:
+                mask = self.entries[:, 0] == row
+                cosine[row] = float(sims[mask].max()) if mask.any() else 0.0
+
+        ranked = []
+        for row, cos in cosine.items():
+            lexical, col = self._lexical(quote, row)
+            score = weight * max(cos, 0.0) * 100 + (1 - weight) * lexical
+            ranked.append({"row": int(row), "score": score, "cosine": cos, "lexical": lexical, "col": col})
+        ranked.sort(key=lambda r: (-r["score"], r["row"]))
+        return ranked[:k]
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_semantic_index(pks_path, binh_path, df_pks, index_dir=None):
+    """
+    Lazily memory-map the index built by `python -m src.semantic_index build`.
+    Returns None (once with a hint) when it was never built or the CSVs changed since.
+    """
+    index_dir = index_dir or default_index_dir(pks_path)
+    source = source_signature([pks_path, binh_path])
+    key = os.path.abspath(index_dir)
+    with _loaded_lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached.source == source:
+            return cached
+        index = SemanticIndex.load(index_dir, df_pks, source=source)
+        if index is None:
+            print(f"⚠️ No up-to-date semantic index at {index_dir} – "
+                  f"build it with: python -m src.semantic_index build")
+            return None
+        _loaded[key] = index
+        return index
+
+
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Dense retrieval index for quote matching")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Embed the corpus and write <pks>.semidx/")
+    p_query = sub.add_parser("query", help="Show the best matches for a quote")
+    p_query.add_argument("quote")
+    p_query.add_argument("-k", type=int, default=5)
+    for p in (p_build, p_query):
+        p.add_argument("--pks", default="data/TuThu_PKS_007.csv")
+        p.add_argument("--binh", default="data/TuThu_BinhGiai_PKS_007.csv")
+        p.add_argument("--index-dir")
+    p_build.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    def read(path):
+        df = pd.read_csv(path)
+        df.columns = [c.strip() for c in df.columns]
+        return df
+
+    df_pks = read(args.pks)
+    index_dir = args.index_dir or default_index_dir(args.pks)
+    if args.cmd == "build":
+        index = SemanticIndex.build(df_pks, read(args.binh), model_name=args.model,
+                                    source=source_signature([args.pks, args.binh]))
+        index.save(index_dir)
+        print(f"🧭 Semantic index: {index.vectors.shape[0]} vectors × {index.vectors.shape[1]} dims → {index_dir}")
+    else:
+        index = load_semantic_index(args.pks, args.binh, df_pks, index_dir)
+        if index is not None:
+            for hit in index.search(args.quote, k=args.k):
+                sent_id = df_pks.iloc[hit["row"]].get("sent_id", hit["row"])
+                print(f"{sent_id}  score={hit['score']:.1f}  cos={hit['cosine']:.3f}  "
+                      f"lex={hit['lexical']:.0f} ({hit['col']})")
@@ -0,0 +1,231 @@
+# Append-only story log (SQLite, WAL mode) with storyboards deduplicated by content hash.
+import os
+import csv
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+DEFAULT_LOG_PATH = os.getenv("STORY_LOG_PATH", "outputs/logs/story_log.sqlite")
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS storyboards (
+           hash TEXT PRIMARY KEY,
+           data BLOB NOT NULL,
+           size INTEGER NOT NULL
+       )""",
+    """CREATE TABLE IF NOT EXISTS stories (
+           seq INTEGER PRIMARY KEY AUTOINCREMENT,
+           ts REAL NOT NULL,
+           story_id TEXT NOT NULL,
+           quote TEXT NOT NULL,
+           title TEXT NOT NULL,
+           storyboard_hash TEXT REFERENCES storyboards(hash)
+       )""",
+    "CREATE INDEX IF NOT EXISTS idx_stories_story_id ON stories(story_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_stories_ts ON stories(ts)",
+    "CREATE INDEX IF NOT EXISTS idx_stories_quote ON stories(quote, ts)",
+)
+
+
+def storyboard_hash(storyboard_bytes):
+    return hashlib.sha256(storyboard_bytes).hexdigest()
+
+
+def _encode_storyboard(story):
+    """Compact canonical JSON bytes for a storyboard dict."""
+    return json.dumps(story, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _to_ts(value):
+    """Accept epoch seconds, datetime or an ISO string."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class StoryLog:
+    """
+    stories: one row per logged story (seq, ts, story_id, quote, title, storyboard_hash)
+    storyboards: zlib-compressed storyboard JSON keyed by SHA-256, stored once.
+
+    WAL mode + a busy timeout let several threads/processes append to the same file;
+    each append is one short IMMEDIATE transaction, rows are never updated.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+
+    def append(self, story_id, quote, title, story=None, ts=None):
+        """Log one story; `story` is the storyboard dict (or None). Returns the row's seq."""
+        return self.append_many([(story_id, quote, title, story, ts)])[-1]
+
+    def append_many(self, entries):
+        """Log (story_id, quote, title, story, ts) tuples in a single transaction. Returns their seqs."""
+        rows, blobs = [], {}
+        for story_id, quote, title, story, ts in entries:
+            digest = None
+            if story is not None:
+                data = _encode_storyboard(story)
+                digest = storyboard_hash(data)
+                if digest not in blobs:
+                    blobs[digest] = (zlib.compress(data, 6), len(data))
+            rows.append((ts if ts is not None else time.time(), str(story_id),
+                         (quote or "").strip(), (title or "N/A").strip(), digest))
+
+        seqs = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO storyboards (hash, data, size) VALUES (?, ?, ?)",
+                    [(h, blob, size) for h, (blob, size) in blobs.items()],
+                )
+                for row in rows:
+                    cur = self._conn.execute(
+                        "INSERT INTO stories (ts, story_id, quote, title, storyboard_hash) VALUES (?, ?, ?, ?, ?)",
+                        row,
+                    )
+                    seqs.append(cur.lastrowid)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seqs
+
+    def query(self, story_id=None, since=None, until=None, quote=None, quote_contains=None, limit=None):
+        """
+        Log entries (newest first) as dicts without the storyboard body.
+        story_id / quote are exact matches on indexed columns; since/until bound
+        the timestamp; quote_contains is a substring match (full scan).
+        """
+        clauses, params = [], []
+        if story_id is not None:
+            clauses.append("story_id = ?")
+            params.append(str(story_id))
+        if quote is not None:
+            clauses.append("quote = ?")
+            params.append(quote.strip())
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(_to_ts(since))
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(_to_ts(until))
+        if quote_contains:
+            clauses.append("instr(quote, ?) > 0")
+            params.append(quote_contains)
+        sql = "SELECT seq, ts, story_id, quote, title, storyboard_hash FROM stories"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC, seq DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        keys = ("seq", "ts", "story_id", "quote", "title", "storyboard_hash")
+        return [dict(zip(keys, r)) for r in rows]
+
+    def storyboard(self, digest):
+        """Decoded storyboard dict for a hash, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM storyboards WHERE hash = ?", (digest,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+            blobs, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(data)), 0) FROM storyboards"
+            ).fetchone()
+        return {"entries": entries, "storyboards": blobs, "storyboard_bytes": raw, "stored_bytes": stored}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def import_csv(log, csv_path, history_dir=None):
+    """
+    One-off migration of a legacy story_log.csv. Full storyboards are taken from
+    the storyboard_history snapshots when present (the CSV column is truncated).
+    Returns the number of imported rows.
+    """
+    history_dir = history_dir or os.path.join(os.path.dirname(csv_path), "storyboard_history")
+    entries = []
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            story = None
+            snapshot = os.path.join(history_dir, row.get("JSON_File") or "")
+            if row.get("JSON_File") and os.path.exists(snapshot):
+                try:
+                    with open(snapshot, "r", encoding="utf-8") as sf:
+                        story = json.load(sf)
+                except ValueError:
+                    story = None
+            ts = datetime.strptime(row["Timestamp"], "%Y-%m-%d %H:%M:%S").timestamp()
+            entries.append((row["Story_ID"], row["Quote"], row["Story_Title"], story, ts))
+    if entries:
+        log.append_many(entries)
+    return len(entries)
+
+
+_default_logs = {}
+_default_lock = threading.Lock()
+
+
+def get_story_log(path=DEFAULT_LOG_PATH):
+    """Process-wide StoryLog per path."""
+    path = os.path.abspath(path) if path != ":memory:" else path
+    with _default_lock:
+        log = _default_logs.get(path)
+        if log is None:
+            log = _default_logs[path] = StoryLog(path)
+        return log
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Story log utilities")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_imp = sub.add_parser("import-csv", help="Migrate a legacy story_log.csv")
+    p_imp.add_argument("csv_path")
+    p_q = sub.add_parser("query", help="List log entries")
+    p_q.add_argument("--story-id")
+    p_q.add_argument("--since", help="ISO date/time")
+    p_q.add_argument("--until", help="ISO date/time")
+    p_q.add_argument("--quote-contains")
+    p_q.add_argument("--limit", type=int, default=20)
+    for p in (p_imp, p_q):
+        p.add_argument("--db", default=DEFAULT_LOG_PATH)
+    args = parser.parse_args()
+
+    story_log = StoryLog(args.db)
+    if args.cmd == "import-csv":
+        n = import_csv(story_log, args.csv_path)
+        print(f"Imported {n} entries → {args.db}")
+    else:
+        for e in story_log.query(story_id=args.story_id, since=args.since, until=args.until,
+                                 quote_contains=args.quote_contains, limit=args.limit):
+            when = datetime.fromtimestamp(e["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{when}  {e['story_id']:<12} {e['title'][:40]:<40} {e['quote'][:60]}")
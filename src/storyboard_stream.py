@@ -0,0 +1,72 @@
+# Incremental parser: emit storyboard image_prompts[i] as soon as each object is complete.
+import json
+
+
+class ImagePromptStreamParser:
+    """
+    Feed raw JSON text chunks as they stream from Gemini; `feed()` returns the
+    image_prompts objects that became complete in that chunk.
+    Only the top-level "image_prompts" array is tracked (the scanner follows
+    strings/escapes and nesting depth, so the key inside a dialogue string is ignored).
+    """
+
+    TARGET_KEY = "image_prompts"
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_key = None          # last string seen at depth 1 (object key candidate)
+        self.array_depth = None       # depth inside the target array, None when outside
+        self.obj_start = None
+        self.emitted = 0
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        out = []
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.array_depth is None:
+                        self.last_key = buf[self.string_start + 1:i]
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in "{[":
+                self.depth += 1
+                if ch == "[" and self.depth == 2 and self.last_key == self.TARGET_KEY:
+                    self.array_depth = self.depth
+                elif ch == "{" and self.array_depth is not None and self.depth == self.array_depth + 1:
+                    self.obj_start = i
+            elif ch in "}]":
+                if (ch == "}" and self.array_depth is not None
+                        and self.depth == self.array_depth + 1 and self.obj_start is not None):
+                    try:
+                        out.append(json.loads(buf[self.obj_start:i + 1]))
+                        self.emitted += 1
+                    except json.JSONDecodeError:
+                        pass
+                    self.obj_start = None
+                if ch == "]" and self.array_depth is not None and self.depth == self.array_depth:
+                    self.array_depth = None
+                    self.last_key = None
+                self.depth -= 1
+            elif ch == "," and self.depth == 1:
+                self.last_key = None
+            i += 1
+        self.pos = i
+        return out
+
+    def text(self):
+        return self.buffer
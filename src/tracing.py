@@ -0,0 +1,293 @@
+# Lightweight span tracing for the pipeline stages (wall/CPU time, process max RSS, diffusion step times).
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextlib
+import contextvars
+from collections import namedtuple
+
+TRACING_ENABLED = os.getenv("TRACING", "false").lower() == "true"
+TRACE_PATH = os.getenv("TRACE_PATH", "outputs/logs/traces.jsonl")
+TRACE_PROM_PATH = os.getenv("TRACE_PROM_PATH", "outputs/logs/pipeline_metrics.prom")
+KEEP_TRACES = 20
+
+_current = contextvars.ContextVar("current_span", default=None)
+_collector = contextvars.ContextVar("span_collector", default=None)  # set in pool workers, see call_traced
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+_recent = []    # finished root traces, newest last: [{"trace_id", "name", "spans": [...]}]
+_open = {}      # trace_id → finished spans of a trace whose root is still running
+_totals = {}    # span name → {"count", "wall_s", "cpu_s", "max_rss_mb"}
+_steps = {"count": 0, "seconds": 0.0}
+
+
+def is_enabled():
+    return TRACING_ENABLED
+
+
+def set_enabled(enabled):
+    global TRACING_ENABLED
+    TRACING_ENABLED = bool(enabled)
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+
+
+_Parent = namedtuple("_Parent", "trace_id span_id")
+
+
+class Span:
+    """
+    One timed stage. wall_s is elapsed time, cpu_s is process CPU time over the same
+    interval (all threads). max_rss_mb is the process-lifetime RSS high-water mark
+    (ru_maxrss) when the span ended – not a per-span peak; max_rss_growth_mb is how
+    far the span raised that mark (0 when an earlier stage had already peaked higher).
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "start", "wall_s", "cpu_s",
+                 "max_rss_mb", "max_rss_growth_mb", "status", "step_times", "_t0", "_c0", "_rss0",
+                 "_token")
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.status = "ok"
+        self.step_times = []
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_step(self, seconds):
+        self.step_times.append(seconds)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        self._rss0 = _max_rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_s = time.perf_counter() - self._t0
+        self.cpu_s = time.process_time() - self._c0
+        self.max_rss_mb = _max_rss_mb()
+        self.max_rss_growth_mb = (self.max_rss_mb - self._rss0) if self._rss0 is not None else None
+        if exc_type is not None:
+            self.status = f"error: {exc_type.__name__}"
+        _current.reset(self._token)
+        _finish(self)
+        return False
+
+    def to_dict(self):
+        d = {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "start": self.start, "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6), "max_rss_mb": self.max_rss_mb,
+            "max_rss_growth_mb": self.max_rss_growth_mb, "status": self.status,
+        }
+        if self.attrs:
+            d["attrs"] = self.attrs
+        if self.step_times:
+            steps = sorted(self.step_times)
+            d["diffusion_steps"] = {
+                "count": len(steps),
+                "mean_s": round(sum(steps) / len(steps), 6),
+                "p50_s": round(steps[len(steps) // 2], 6),
+                "max_s": round(steps[-1], 6),
+            }
+        return d
+
+
+def span(name, **attrs):
+    """
+    Context manager timing one stage; nests under the current span (also across
+    asyncio.to_thread / contextvars.copy_context). A shared no-op when tracing is off.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP
+    return Span(name, _current.get(), attrs)
+
+
+def current_span():
+    return _current.get() if TRACING_ENABLED else None
+
+
+def set_attrs(**attrs):
+    """Attach attributes to the current span (no-op when tracing is off)."""
+    s = current_span()
+    if s is not None:
+        s.set(**attrs)
+
+
+def step_callback():
+    """
+    diffusers `callback_on_step_end` recording per-step time on the current span,
+    or None when tracing is off (callers then pass no callback at all).
+    """
+    s = current_span()
+    if s is None:
+        return None
+    last = [time.perf_counter()]
+
+    def on_step_end(pipe, step, timestep, callback_kwargs):
+        now = time.perf_counter()
+        s.record_step(now - last[0])
+        last[0] = now
+        return callback_kwargs
+
+    return on_step_end
+
+
+def trace_parent():
+    """(trace_id, span_id) of the current span, or None – picklable, for call_traced."""
+    s = current_span()
+    return (s.trace_id, s.span_id) if s is not None else None
+
+
+def call_traced(parent, name, fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) in a span under `parent` (from trace_parent()). Meant for
+    process pools, where contextvars don't travel: the worker's spans are collected
+    and returned as (result, span_records) for the caller to pass to adopt_spans().
+    """
+    if parent is None:
+        return fn(*args, **kwargs), []
+    records = []
+    token = _collector.set(records)
+    try:
+        with Span(name, _Parent(*parent), {"pid": os.getpid()}):
+            result = fn(*args, **kwargs)
+    finally:
+        _collector.reset(token)
+    return result, records
+
+
+def adopt_spans(records):
+    """Record spans finished in another process (see call_traced) as if they ran here."""
+    for record in records:
+        steps = record.get("diffusion_steps") or {}
+        _record(record, steps.get("count", 0), steps.get("mean_s", 0.0) * steps.get("count", 0))
+
+
+def _finish(s):
+    record = s.to_dict()
+    sink = _collector.get()
+    if sink is not None:
+        sink.append(record)
+        return
+    _record(record, len(s.step_times), sum(s.step_times))
+
+
+def _record(record, step_count, step_seconds):
+    name, trace_id, is_root = record["name"], record["trace_id"], record["parent_id"] is None
+    with _lock:
+        t = _totals.setdefault(name, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_rss_mb": 0.0})
+        t["count"] += 1
+        t["wall_s"] += record["wall_s"]
+        t["cpu_s"] += record["cpu_s"]
+        t["max_rss_mb"] = max(t["max_rss_mb"], record["max_rss_mb"] or 0.0)
+        _steps["count"] += step_count
+        _steps["seconds"] += step_seconds
+        spans = _open.setdefault(trace_id, [])
+        spans.append(record)
+        if is_root:
+            del _open[trace_id]
+            _recent.append({"trace_id": trace_id, "name": name, "spans": spans})
+            del _recent[:-KEEP_TRACES]
+    try:
+        _export_jsonl(record)
+        if is_root:
+            export_prometheus()
+    except OSError as e:
+        print(f"⚠️ Trace export failed: {e}")
+
+
+def _export_jsonl(record):
+    if not TRACE_PATH:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(TRACE_PATH)), exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _lock, open(TRACE_PATH, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def prometheus_text():
+    """Cumulative per-stage metrics in the Prometheus text exposition format."""
+    with _lock:
+        totals = {k: dict(v) for k, v in _totals.items()}
+        steps = dict(_steps)
+    lines = [
+        "# HELP pipeline_stage_seconds_total Wall time spent in a pipeline stage.",
+        "# TYPE pipeline_stage_seconds_total counter",
+    ]
+    lines += [f'pipeline_stage_seconds_total{{stage="{k}"}} {v["wall_s"]:.6f}' for k, v in totals.items()]
+    lines += ["# HELP pipeline_stage_cpu_seconds_total Process CPU time spent in a pipeline stage.",
+              "# TYPE pipeline_stage_cpu_seconds_total counter"]
+    lines += [f'pipeline_stage_cpu_seconds_total{{stage="{k}"}} {v["cpu_s"]:.6f}' for k, v in totals.items()]
+    lines += ["# HELP pipeline_stage_runs_total Number of times a pipeline stage ran.",
+              "# TYPE pipeline_stage_runs_total counter"]
+    lines += [f'pipeline_stage_runs_total{{stage="{k}"}} {v["count"]}' for k, v in totals.items()]
+    lines += ["# HELP pipeline_stage_process_max_rss_bytes Process-lifetime RSS high-water mark "
+              "(ru_maxrss) at the end of a stage; not a per-stage peak.",
+              "# TYPE pipeline_stage_process_max_rss_bytes gauge"]
+    lines += [f'pipeline_stage_process_max_rss_bytes{{stage="{k}"}} {int(v["max_rss_mb"] * 1024 * 1024)}'
+              for k, v in totals.items()]
+    lines += ["# HELP diffusion_step_seconds_total Time spent in individual denoising steps.",
+              "# TYPE diffusion_step_seconds_total counter",
+              f"diffusion_step_seconds_total {steps['seconds']:.6f}",
+              "# HELP diffusion_steps_total Number of denoising steps run.",
+              "# TYPE diffusion_steps_total counter",
+              f"diffusion_steps_total {steps['count']}"]
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(path=None):
+    """Write prometheus_text() atomically (for a node_exporter textfile collector)."""
+    path = path or TRACE_PROM_PATH
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def recent_traces():
+    with _lock:
+        return list(_recent)
+
+
+def last_trace_summary(name="run_pipeline"):
+    """Per-stage rows of the most recent finished trace with root `name` (or None)."""
+    with _lock:
+        trace = next((t for t in reversed(_recent) if t["name"] == name), None)
+    if trace is None:
+        return None
+    rows = {}
+    for s in trace["spans"]:
+        row = rows.setdefault(s["name"], {"stage": s["name"], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                          "max_rss_mb": 0.0, "max_rss_growth_mb": 0.0,
+                                          "start": s["start"]})
+        row["calls"] += 1
+        row["wall_s"] += s["wall_s"]
+        row["cpu_s"] += s["cpu_s"]
+        row["max_rss_mb"] = max(row["max_rss_mb"], s["max_rss_mb"] or 0.0)
+        row["max_rss_growth_mb"] += s.get("max_rss_growth_mb") or 0.0
+        row["start"] = min(row["start"], s["start"])
+        if "diffusion_steps" in s:
+            row["step_s"] = s["diffusion_steps"]["mean_s"]
+    return sorted(rows.values(), key=lambda r: r["start"])
@@ -0,0 +1,39 @@
+# Gemini client manager: one model per (model, system prompt), with the transport stubbed out.
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.gemini_client import set_model_factory, FakeGenerativeModel, get_model
+
+STORY = {"story_title": "T", "summary": "s", "panels": [], "image_prompts": []}
+
+
+@pytest.fixture(autouse=True)
+def fake_models():
+    set_model_factory(FakeGenerativeModel.factory(STORY))
+    FakeGenerativeModel.instances = 0
+    yield
+    set_model_factory(None)
+
+
+def test_one_client_across_calls():
+    models = [get_model("models/gemini-2.5-pro", "system") for _ in range(5)]
+    for model in models:
+        model.generate_content("prompt")
+    assert FakeGenerativeModel.instances == 1
+    assert all(m is models[0] for m in models)
+    assert models[0].calls == 5
+
+
+def test_one_client_across_threads():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        models = list(pool.map(lambda _: get_model("models/gemini-2.5-pro", "system"), range(32)))
+    assert FakeGenerativeModel.instances == 1
+    assert len({id(m) for m in models}) == 1
+
+
+def test_new_client_per_system_prompt():
+    get_model("models/gemini-2.5-pro", "system")
+    get_model("models/gemini-2.5-pro", "other system")
+    get_model("models/gemini-2.5-pro", "system")
+    assert FakeGenerativeModel.instances == 2
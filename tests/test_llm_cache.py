@@ -0,0 +1,73 @@
+# LLM response cache: hit / miss / eviction, with the Gemini client stubbed out.
+import pytest
+
+from src.gemini_client import set_model_factory, FakeGenerativeModel, get_model
+from src.llm_cache import LLMCache
+
+STORY = {"story_title": "T", "summary": "s", "panels": [], "image_prompts": []}
+
+
+def _context(sent_id, quote="康誥曰：克明德。"):
+    return {"id": sent_id, "quote": quote, "binh_giai": "b", "y_nghia": "y",
+            "boi_canh": "c", "nhan_vat": "n", "prompt_mau": "p"}
+
+
+@pytest.fixture
+def main_pipeline():
+    pytest.importorskip("torch")  # src.main_pipeline imports the diffusion stage
+    from src import main_pipeline
+    return main_pipeline
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch, main_pipeline):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setattr(main_pipeline, "get_llm_cache", lambda: cache)
+    set_model_factory(FakeGenerativeModel.factory(STORY))
+    yield cache
+    set_model_factory(None)
+
+
+def _model(main_pipeline):
+    return get_model(main_pipeline.MODEL_TEXT, main_pipeline.get_system_prompt())
+
+
+def test_miss_then_hit(cache, main_pipeline):
+    assert main_pipeline.call_gemini(_context("PKS_007.001.001"), use_cache=True) == STORY
+    assert main_pipeline.call_gemini(_context("PKS_007.001.001"), use_cache=True) == STORY
+    assert _model(main_pipeline).calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_same_prompt_different_sentence_misses(cache, main_pipeline):
+    main_pipeline.call_gemini(_context("PKS_007.005.007"), use_cache=True)
+    main_pipeline.call_gemini(_context("PKS_007.005.012"), use_cache=True)
+    assert _model(main_pipeline).calls == 2
+    assert len(cache) == 2
+
+
+def test_refresh_overwrites(cache, main_pipeline):
+    main_pipeline.call_gemini(_context("PKS_007.001.001"), use_cache=True)
+    main_pipeline.call_gemini(_context("PKS_007.001.001"), use_cache=True, refresh=True)
+    assert _model(main_pipeline).calls == 2
+    assert len(cache) == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"), max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.put(key, key * 100)
+    # 300 bytes > 250: the least recently accessed entry ("a") is gone
+    assert cache.get("a") is None
+    assert cache.get("b") is not None  # "b" is now the most recently used
+    cache.put("d", "d" * 100)
+    assert cache.get("c") is None
+    assert cache.get("b") is not None and cache.get("d") is not None
+
+
+def test_ttl_expiry(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"), ttl_seconds=1)
+    cache.put("k", "v")
+    cache._conn.execute("UPDATE responses SET created = created - 10")
+    assert cache.get("k") is None
+    assert len(cache) == 0
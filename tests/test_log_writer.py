@@ -0,0 +1,76 @@
+# Background story-log writer: flush() writes everything queued and never hangs on a dead thread.
+import time
+
+import pytest
+
+from src.log_writer import BackgroundLogWriter
+
+
+def test_flush_writes_queued_records(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "stories.sqlite"), flush_seconds=0.05)
+    for n in range(5):
+        writer.submit(f"s{n}", "quote", "title")
+    assert writer.flush(timeout=5)
+    assert writer.written == 5
+    writer.close()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_flush_returns_when_writer_thread_died(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "stories.sqlite"), flush_seconds=0.05)
+
+    def crash(entries):
+        raise SystemExit  # not caught by the writer: ends its thread
+
+    writer.log.append_many = crash
+    writer.submit("s1", "quote", "title")
+    t0 = time.monotonic()
+    assert writer.flush() is False
+    assert time.monotonic() - t0 < 5
+    assert writer.flush() is False  # thread already gone: returns right away
+
+
+def test_flush_after_close(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "stories.sqlite"), flush_seconds=0.05)
+    writer.close()
+    assert writer.flush() is False
+
+
+def _spill_file(path, *story_ids):
+    with open(path, "a", encoding="utf-8") as f:
+        for story_id in story_ids:
+            f.write(BackgroundLogWriter._spill_line((story_id, "quote", "title", None, 1.0)))
+
+
+def _logged(writer):
+    return sorted(e["story_id"] for e in writer.log.query())
+
+
+def test_failed_spill_replay_keeps_records(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "stories.sqlite")
+    _spill_file(log_path + ".spill.jsonl", "s1", "s2")
+    from src.story_log import StoryLog
+
+    def broken(self, entries):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(StoryLog, "append_many", broken)
+    writer = BackgroundLogWriter(log_path, flush_seconds=0.05)
+    writer.flush(timeout=5)
+    assert (tmp_path / "stories.sqlite.spill.jsonl.replay").exists()
+
+    monkeypatch.undo()  # storage is back: the next replay writes the kept records
+    assert writer.flush(timeout=5)
+    assert _logged(writer) == ["s1", "s2"]
+    assert not (tmp_path / "stories.sqlite.spill.jsonl.replay").exists()
+    writer.close()
+
+
+def test_leftover_replay_file_is_not_overwritten(tmp_path):
+    log_path = str(tmp_path / "stories.sqlite")
+    _spill_file(log_path + ".spill.jsonl.replay", "crashed")  # claimed by a run that died
+    _spill_file(log_path + ".spill.jsonl", "new")
+    writer = BackgroundLogWriter(log_path, flush_seconds=0.05)
+    assert writer.flush(timeout=5)
+    assert _logged(writer) == ["crashed", "new"]
+    writer.close()
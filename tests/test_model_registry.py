@@ -0,0 +1,86 @@
+# Diffusion pipeline registry: load once, per-key load locks, LRU cap – with DummyDiffusionPipeline.
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import model_registry
+from src.model_registry import DummyDiffusionPipeline, get_pipeline, loaded_pipelines, set_pipeline_loader
+
+
+@pytest.fixture(autouse=True)
+def dummy_loader():
+    set_pipeline_loader(DummyDiffusionPipeline.loader)
+    DummyDiffusionPipeline.loads = 0
+    yield
+    set_pipeline_loader(None)
+
+
+def test_loaded_once_across_calls():
+    pipes = [get_pipeline("dummy", "cpu", "float32") for _ in range(5)]
+    assert DummyDiffusionPipeline.loads == 1
+    assert all(p is pipes[0] for p in pipes)
+
+
+def test_concurrent_callers_share_one_load():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pipes = list(pool.map(lambda _: get_pipeline("dummy", "cpu", "float32"), range(16)))
+    assert DummyDiffusionPipeline.loads == 1
+    assert len({id(p) for p in pipes}) == 1
+
+
+def test_slow_load_does_not_block_other_keys(monkeypatch):
+    monkeypatch.setattr(model_registry, "MAX_PIPELINES", 2)
+    release = threading.Event()
+
+    def loader(model_id, device, dtype):
+        if model_id == "slow":
+            assert release.wait(5), "slow load was never released"
+        return DummyDiffusionPipeline(model_id)
+
+    set_pipeline_loader(loader)
+    cached = get_pipeline("fast", "cpu", "float32")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        slow = pool.submit(get_pipeline, "slow", "cpu", "float32")
+        # While "slow" is still loading, hits and loads of other keys go through
+        assert get_pipeline("fast", "cpu", "float32") is cached
+        assert get_pipeline("other", "cpu", "float32").model_id == "other"
+        assert not slow.done()
+        release.set()
+        assert slow.result(timeout=5).model_id == "slow"
+
+
+def test_lru_eviction(monkeypatch):
+    monkeypatch.setattr(model_registry, "MAX_PIPELINES", 1)
+    get_pipeline("a", "cpu", "float32")
+    get_pipeline("b", "cpu", "float32")
+    assert [key[0] for key in loaded_pipelines()] == ["b"]
+    get_pipeline("a", "cpu", "float32")
+    assert DummyDiffusionPipeline.loads == 3
+
+
+def test_generate_flux_images_loads_pipeline_once(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    from src import generate_flux_images as gfi
+    monkeypatch.delenv("FAST_MODE", raising=False)
+    monkeypatch.setattr(gfi, "PANEL_CACHE_ENABLED", False)
+    prompts = [{"panel": f"{i:02d}", "prompt": f"panel {i}"} for i in range(1, 4)]
+    for story in ("a", "b"):
+        stats = gfi.generate_flux_images(prompts, output_dir=str(tmp_path / story))
+        assert stats["panels"] == 3
+        assert (tmp_path / story / "panel_03.png").exists()
+    assert DummyDiffusionPipeline.loads == 1
+
+
+def test_compiled_pipeline_has_its_own_entry(monkeypatch):
+    pytest.importorskip("torch")
+    from src import generate_flux_images as gfi
+    monkeypatch.setattr(model_registry, "MAX_PIPELINES", 2)
+    model_registry.unload()
+    monkeypatch.delenv("DIFFUSION_COMPILE", raising=False)
+    plain, _ = gfi.load_diffusion_pipeline("balanced", "cpu", "dummy")
+    monkeypatch.setenv("DIFFUSION_COMPILE", "true")
+    compiled, _ = gfi.load_diffusion_pipeline("balanced", "cpu", "dummy")
+    assert compiled is not plain
+    assert DummyDiffusionPipeline.loads == 2
+    assert sorted(key[3] for key in loaded_pipelines()) == ["balanced", "balanced+compile"]
@@ -0,0 +1,65 @@
+# Panel cache shared between workers: every process sees the same index.
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from src.panel_cache import PanelCache
+
+
+def _panel(path, color="white"):
+    Image.new("RGB", (64, 64), color).save(path)
+    return str(path)
+
+
+def _store_many(cache_dir, src, keys):
+    cache = PanelCache(cache_dir)
+    for key in keys:
+        cache.store(key, src)
+    return len(keys)
+
+
+def test_workers_see_each_others_panels(tmp_path):
+    src = _panel(tmp_path / "panel.png")
+    a = PanelCache(str(tmp_path / "cache"))
+    b = PanelCache(str(tmp_path / "cache"))
+    a.store("k1", src)
+    b.store("k2", src)
+    assert len(a) == len(b) == 2
+    assert a.fetch("k2", str(tmp_path / "out.png"))
+    assert b.fetch("k1", str(tmp_path / "out.png"))
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    src = _panel(tmp_path / "panel.png")
+    cache_dir = str(tmp_path / "cache")
+    jobs = [[f"w{w}_{i}" for i in range(10)] for w in range(4)]
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        assert sum(pool.map(_store_many, [cache_dir] * 4, [src] * 4, jobs)) == 40
+    cache = PanelCache(cache_dir)
+    assert len(cache) == 40
+    assert len(list((tmp_path / "cache").glob("*.png"))) == 40
+
+
+def test_eviction_by_another_worker_is_a_miss(tmp_path):
+    src = _panel(tmp_path / "panel.png")
+    size = (tmp_path / "panel.png").stat().st_size
+    a = PanelCache(str(tmp_path / "cache"), max_bytes=size)
+    b = PanelCache(str(tmp_path / "cache"), max_bytes=size)
+    a.store("old", src)
+    b.store("new", src)  # over the cap: b evicts a's panel
+    assert not a.fetch("old", str(tmp_path / "out.png"))
+    assert a.fetch("new", str(tmp_path / "out.png"))
+    assert a.total_bytes() == size
+
+
+def test_legacy_manifest_is_imported(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    _panel(cache_dir / "k.png")
+    entry = {"size": (cache_dir / "k.png").stat().st_size, "created": 1.0, "accessed": 1.0}
+    (cache_dir / "manifest.json").write_text(json.dumps({"k": entry, "gone": entry}))
+    cache = PanelCache(str(cache_dir))
+    assert len(cache) == 1
+    assert cache.fetch("k", str(tmp_path / "out.png"))
+    assert not (cache_dir / "manifest.json").exists()
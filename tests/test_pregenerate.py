@@ -0,0 +1,101 @@
+# Offline pre-generation: resume, stale/force regeneration and failure handling,
+# with the Gemini client and the diffusion pipeline stubbed out.
+import pytest
+
+from src.gemini_client import set_model_factory, FakeGenerativeModel, get_model
+from src.llm_cache import LLMCache
+from src.model_registry import set_pipeline_loader, DummyDiffusionPipeline
+
+
+def _story(n_panels):
+    return {
+        "story_title": f"{n_panels}-panel story",
+        "summary": "s",
+        "panels": [{"panel": f"{i:02d}", "moral_link": f"caption {i}"} for i in range(1, n_panels + 1)],
+        "image_prompts": [{"panel": f"{i:02d}", "prompt": f"panel {i}"} for i in range(1, n_panels + 1)],
+    }
+
+
+@pytest.fixture
+def pregenerate(tmp_path, monkeypatch):
+    pytest.importorskip("torch")  # src.pregenerate imports the diffusion stage
+    from src import main_pipeline, pregenerate, generate_flux_images
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setattr(main_pipeline, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(pregenerate, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(main_pipeline, "append_story_log", lambda **kwargs: None)
+    monkeypatch.setattr(generate_flux_images, "PANEL_CACHE_ENABLED", False)
+    monkeypatch.delenv("FAST_MODE", raising=False)
+    set_model_factory(FakeGenerativeModel.factory(_story(6)))
+    set_pipeline_loader(DummyDiffusionPipeline.loader)
+    yield pregenerate
+    set_model_factory(None)
+    set_pipeline_loader(None)
+
+
+@pytest.fixture
+def sent_id(pregenerate):
+    from src.corpus_store import get_corpus
+    from src.main_pipeline import DATA_PKS, DATA_BINH, DATA_STYLE
+    return next(iter(get_corpus(DATA_PKS, DATA_BINH, DATA_STYLE).sent_rows))
+
+
+def _run(pregenerate, root, sent_id, **kwargs):
+    return pregenerate.pregenerate_all([sent_id], root=str(root), llm_rate=0, **kwargs)
+
+
+def _llm_calls():
+    from src import main_pipeline
+    return get_model(main_pipeline.MODEL_TEXT, main_pipeline.get_system_prompt()).calls
+
+
+def test_done_entry_is_skipped(pregenerate, sent_id, tmp_path):
+    root = tmp_path / "pregenerated"
+    assert _run(pregenerate, root, sent_id) == {"done": 1, "skipped": 0, "failed": 0}
+    assert _run(pregenerate, root, sent_id) == {"done": 0, "skipped": 1, "failed": 0}
+    entry = pregenerate.PregeneratedStore(str(root)).entries()[sent_id]
+    assert entry["status"] == "done" and (root / sent_id / "comic_story_full.pdf").exists()
+    assert _llm_calls() == 1
+
+
+def test_render_failure_is_not_done(pregenerate, sent_id, tmp_path, monkeypatch):
+    root = tmp_path / "pregenerated"
+    monkeypatch.setattr(pregenerate, "render_story_page", lambda *args, **kwargs: None)
+    assert _run(pregenerate, root, sent_id) == {"done": 0, "skipped": 0, "failed": 1}
+    entry = pregenerate.PregeneratedStore(str(root)).entries()[sent_id]
+    assert entry["status"] == "failed" and entry["error"].startswith("render:")
+
+
+def test_force_replaces_previous_story(pregenerate, sent_id, tmp_path):
+    root = tmp_path / "pregenerated"
+    _run(pregenerate, root, sent_id)
+    assert len(list((root / sent_id).glob("panel_0?.png"))) == 6
+
+    set_model_factory(FakeGenerativeModel.factory(_story(2)))
+    pregenerate.get_llm_cache().clear()  # the model now answers with a shorter storyboard
+    assert _run(pregenerate, root, sent_id, force=True)["done"] == 1
+    assert sorted(p.name for p in (root / sent_id).glob("panel_0?.png")) == ["panel_01.png", "panel_02.png"]
+    assert b"/Count 1 " in (root / sent_id / "comic_story_full.pdf").read_bytes()
+
+
+def test_interrupted_run_resumes_without_llm(pregenerate, sent_id, tmp_path, monkeypatch):
+    root = tmp_path / "pregenerated"
+    real = pregenerate.generate_flux_images
+
+    def interrupted(*args, **kwargs):
+        raise RuntimeError("GPU went away")
+
+    monkeypatch.setattr(pregenerate, "generate_flux_images", interrupted)
+    assert _run(pregenerate, root, sent_id)["failed"] == 1
+    assert pregenerate.PregeneratedStore(str(root)).entries()[sent_id]["stage"] == "panels"
+
+    monkeypatch.setattr(pregenerate, "generate_flux_images", real)
+    assert _run(pregenerate, root, sent_id)["done"] == 1
+    assert _llm_calls() == 1  # storyboard.json of the interrupted run was reused
+
+
+def test_fast_mode_is_refused(pregenerate, sent_id, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAST_MODE", "true")
+    with pytest.raises(ValueError, match="FAST_MODE"):
+        _run(pregenerate, tmp_path / "pregenerated", sent_id)
+    assert not (tmp_path / "pregenerated").exists()
@@ -0,0 +1,48 @@
+# Quote index: search returns exactly what the original full RapidFuzz scan returns.
+import random
+
+import pandas as pd
+import pytest
+from rapidfuzz import process, fuzz
+
+from src.columnar import clean_column_name
+from src.quote_index import QuoteIndex
+
+DATA_PKS = "data/TuThu_PKS_007.csv"
+
+
+def _full_scan(quote, df):
+    """find_id_from_quote before the index: extractOne over every row of M, V, C."""
+    best_score, best_idx, best_col = -1, None, None
+    for col in [c for c in ["M", "V", "C"] if c in df.columns]:
+        result = process.extractOne(quote, df[col].fillna("").astype(str).tolist(), scorer=fuzz.token_set_ratio)
+        if result is not None and result[1] > best_score:
+            best_score, best_idx, best_col = result[1], result[2], col
+    return None if best_idx is None else (int(best_idx), best_score, best_col)
+
+
+@pytest.fixture(scope="module")
+def df():
+    df = pd.read_csv(DATA_PKS)
+    df.columns = [clean_column_name(c) for c in df.columns]
+    return df
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return QuoteIndex.from_dataframe(df)
+
+
+def _queries(df, n, seed=7):
+    rng = random.Random(seed)
+    words = [w for col in ("M", "V", "C") for text in df[col].dropna().astype(str) for w in text.split()]
+    queries = ["dã. nhi nhân.", "Duy chi chi;", "", "xyz"]
+    queries += [t for col in ("M", "V", "C") for t in df[col].dropna().astype(str)]
+    queries += [" ".join(rng.choice(words) for _ in range(rng.randint(1, 6))) for _ in range(n)]
+    return queries
+
+
+def test_search_matches_full_scan(df, index):
+    mismatches = [(q, index.search(q), _full_scan(q, df))
+                  for q in _queries(df, 1000) if index.search(q) != _full_scan(q, df)]
+    assert mismatches == []